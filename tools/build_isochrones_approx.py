@@ -1,9 +1,12 @@
 from __future__ import annotations
 
-import json
 import math
 from pathlib import Path
 
+import numpy as np
+
+from geojson_io import write_geojson
+
 
 OUT_DIR = Path("web/data/processed/isochrones")
 OUT_FILE = OUT_DIR / "grand_central_approx_isochrones.geojson"
@@ -24,27 +27,23 @@ EARTH_RADIUS_KM = 6371.0
 
 
 def ring_coordinates(lat: float, lng: float, radius_km: float) -> list[list[float]]:
-    coords = []
     lat_rad = math.radians(lat)
     lng_rad = math.radians(lng)
     angular = radius_km / EARTH_RADIUS_KM
+    sin_lat = math.sin(lat_rad)
+    cos_lat = math.cos(lat_rad)
+    sin_ang = math.sin(angular)
+    cos_ang = math.cos(angular)
 
-    for i in range(POINTS_PER_RING + 1):
-        bearing = 2 * math.pi * (i / POINTS_PER_RING)
-        sin_lat = math.sin(lat_rad)
-        cos_lat = math.cos(lat_rad)
-        sin_ang = math.sin(angular)
-        cos_ang = math.cos(angular)
-
-        lat2 = math.asin(sin_lat * cos_ang + cos_lat * sin_ang * math.cos(bearing))
-        lng2 = lng_rad + math.atan2(
-            math.sin(bearing) * sin_ang * cos_lat,
-            cos_ang - sin_lat * math.sin(lat2),
-        )
-
-        coords.append([math.degrees(lng2), math.degrees(lat2)])
+    # Whole ring at once with NumPy ufuncs instead of a per-vertex math loop.
+    bearing = 2 * np.pi * (np.arange(POINTS_PER_RING + 1) / POINTS_PER_RING)
+    lat2 = np.arcsin(sin_lat * cos_ang + cos_lat * sin_ang * np.cos(bearing))
+    lng2 = lng_rad + np.arctan2(
+        np.sin(bearing) * sin_ang * cos_lat,
+        cos_ang - sin_lat * np.sin(lat2),
+    )
 
-    return coords
+    return np.column_stack([np.degrees(lng2), np.degrees(lat2)]).tolist()
 
 
 def main() -> None:
@@ -68,7 +67,7 @@ def main() -> None:
             )
 
     geojson = {"type": "FeatureCollection", "features": features}
-    OUT_FILE.write_text(json.dumps(geojson))
+    write_geojson(OUT_FILE, geojson)
     print(f"Wrote {OUT_FILE}")
 
 
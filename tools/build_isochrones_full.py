@@ -1,20 +1,34 @@
 from __future__ import annotations
 
-import json
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 import math
+import os
 import time
 
 import networkx as nx
+import numpy as np
 import osmnx as ox
+import shapely
 from pyproj import Transformer
+from scipy.sparse import csr_matrix
 from shapely.geometry import mapping, Point, Polygon
-from shapely.ops import transform as geom_transform
-from shapely.ops import unary_union
 from requests.exceptions import ChunkedEncodingError, RequestException
 from tqdm import tqdm
 
+from geojson_io import write_geojson
+from isochrone_graph import (
+    add_edge_lengths_safe,
+    cached_graph,
+    length_csr,
+    nearest_node,
+    nodes_within,
+    reachable_times,
+    transform_geometry,
+    travel_time_csr,
+)
+
 
 OUT_DIR = Path("web/data/processed/isochrones")
 OUT_FILE = OUT_DIR / "grand_central_full_isochrones.geojson"
@@ -56,14 +70,16 @@ MODES = [
     Mode(key="subway", label="Subway (approx)", speed_kmh=30.0, network="drive"),
 ]
 
+# Worker processes for the per-mode isochrones
+ISOCHRONE_WORKERS = int(os.environ.get("ISOCHRONE_WORKERS", str(min(len(MODES), os.cpu_count() or 1))))
+
 # Buffer (meters) used to turn reachable nodes into a polygon
 BUFFER_M = 200
+# Segments per quarter circle of each node buffer (GeoSeries.buffer used 16)
+BUFFER_QUAD_SEGS = 4
 
-
-def add_edge_lengths_safe(graph: nx.MultiDiGraph) -> nx.MultiDiGraph:
-    if hasattr(ox, "add_edge_lengths"):
-        return ox.add_edge_lengths(graph)
-    return ox.distance.add_edge_lengths(graph)
+# Simplification tolerance (meters, projected) applied to each merged ring
+SIMPLIFY_TOLERANCE_M = 5.0
 
 
 def build_graph(network_type: str, radius_m: int, retries: int = 3) -> nx.MultiDiGraph:
@@ -94,46 +110,36 @@ def build_graph(network_type: str, radius_m: int, retries: int = 3) -> nx.MultiD
             time.sleep(wait_s)
 
 
-def add_travel_time(graph: nx.MultiDiGraph, speed_kmh: float) -> nx.MultiDiGraph:
-    speed_m_s = speed_kmh * 1000 / 3600
-    for _, _, key, data in graph.edges(keys=True, data=True):
-        length = data.get("length", 0)
-        data["travel_time"] = length / speed_m_s if speed_m_s > 0 else 0
-    return graph
-
-
-def graph_to_gdfs_safe(graph: nx.MultiDiGraph):
-    if hasattr(ox, "graph_to_gdfs"):
-        return ox.graph_to_gdfs(graph, edges=False)
-    return ox.utils_graph.graph_to_gdfs(graph, edges=False)
-
+def project_nodes(graph: nx.MultiDiGraph) -> tuple[np.ndarray, Transformer]:
+    """Projected (N, 2) node x/y in graph.nodes order + transformer back to WGS84."""
+    graph_proj = ox.project_graph(graph)
+    # project_graph may reorder nodes: look them up in the unprojected order.
+    projected_nodes = graph_proj.nodes
+    node_xy = np.array(
+        [(projected_nodes[node]["x"], projected_nodes[node]["y"]) for node in graph.nodes],
+        dtype=np.float64,
+    ).reshape(-1, 2)
+    source_crs = graph_proj.graph.get("crs", "EPSG:3857")
+    return node_xy, Transformer.from_crs(source_crs, "EPSG:4326", always_xy=True)
 
-def isochrone_polygon(graph: nx.MultiDiGraph, minutes: int) -> Polygon | None:
-    center_node = ox.distance.nearest_nodes(graph, CENTER_LNG, CENTER_LAT)
-    cutoff = minutes * 60
-    lengths = nx.single_source_dijkstra_path_length(graph, center_node, cutoff=cutoff, weight="travel_time")
-    if not lengths:
-        return None
 
-    nodes = list(lengths.keys())
-    gdf_nodes = graph_to_gdfs_safe(graph).loc[nodes]
-    if gdf_nodes.empty:
+def isochrone_polygon(node_xy: np.ndarray, transformer: Transformer) -> Polygon | None:
+    if len(node_xy) == 0:
         return None
 
-    # Project to meters for buffering
-    graph_proj = ox.project_graph(graph)
-    gdf_nodes_proj = graph_to_gdfs_safe(graph_proj).loc[nodes]
-
-    buffers = gdf_nodes_proj.geometry.buffer(BUFFER_M)
-    merged = unary_union(buffers)
+    # Vectorized shapely 2 ufuncs: no GeoSeries, no per-point Python objects.
+    points = shapely.points(node_xy[:, 0], node_xy[:, 1])
+    buffers = shapely.buffer(points, BUFFER_M, quad_segs=BUFFER_QUAD_SEGS)
+    merged = shapely.unary_union(buffers)
 
     if merged.is_empty:
         return None
 
+    # Drop the near-collinear vertices left by the union before writing.
+    merged = shapely.simplify(merged, SIMPLIFY_TOLERANCE_M, preserve_topology=True)
+
     # Reproject back to WGS84
-    source_crs = graph_proj.graph.get("crs", "EPSG:3857")
-    transformer = Transformer.from_crs(source_crs, "EPSG:4326", always_xy=True)
-    merged_wgs = geom_transform(transformer.transform, merged)
+    merged_wgs = transform_geometry(merged, transformer)
 
     if isinstance(merged_wgs, Point):
         return merged_wgs.buffer(0.001)
@@ -141,27 +147,23 @@ def isochrone_polygon(graph: nx.MultiDiGraph, minutes: int) -> Polygon | None:
 
 
 def ring_coordinates(lat: float, lng: float, radius_km: float, points: int = 96) -> list[list[float]]:
-    coords = []
     lat_rad = math.radians(lat)
     lng_rad = math.radians(lng)
     angular = radius_km / 6371.0
+    sin_lat = math.sin(lat_rad)
+    cos_lat = math.cos(lat_rad)
+    sin_ang = math.sin(angular)
+    cos_ang = math.cos(angular)
 
-    for i in range(points + 1):
-        bearing = 2 * math.pi * (i / points)
-        sin_lat = math.sin(lat_rad)
-        cos_lat = math.cos(lat_rad)
-        sin_ang = math.sin(angular)
-        cos_ang = math.cos(angular)
-
-        lat2 = math.asin(sin_lat * cos_ang + cos_lat * sin_ang * math.cos(bearing))
-        lng2 = lng_rad + math.atan2(
-            math.sin(bearing) * sin_ang * cos_lat,
-            cos_ang - sin_lat * math.sin(lat2),
-        )
-
-        coords.append([math.degrees(lng2), math.degrees(lat2)])
+    # Whole ring at once with NumPy ufuncs instead of a per-vertex math loop.
+    bearing = 2 * np.pi * (np.arange(points + 1) / points)
+    lat2 = np.arcsin(sin_lat * cos_ang + cos_lat * sin_ang * np.cos(bearing))
+    lng2 = lng_rad + np.arctan2(
+        np.sin(bearing) * sin_ang * cos_lat,
+        cos_ang - sin_lat * np.sin(lat2),
+    )
 
-    return coords
+    return np.column_stack([np.degrees(lng2), np.degrees(lat2)]).tolist()
 
 
 def circle_polygon(speed_kmh: float, minutes: int) -> Polygon:
@@ -170,6 +172,48 @@ def circle_polygon(speed_kmh: float, minutes: int) -> Polygon:
     return Polygon(ring)
 
 
+def mode_features(
+    mode: Mode,
+    lengths: tuple[np.ndarray, csr_matrix],
+    center_node,
+    node_xy: np.ndarray,
+    to_wgs: Transformer,
+) -> list[dict]:
+    """All rings of one mode (runs in a worker process)."""
+    # One Dijkstra run up to the largest street-network cutoff serves all rings.
+    network_minutes = [m for m in MINUTES if m <= MAX_NETWORK_MINUTES]
+    if network_minutes:
+        positions, seconds = reachable_times(
+            travel_time_csr(lengths, mode.speed_kmh), center_node, max(network_minutes) * 60
+        )
+
+    features = []
+    for minutes in MINUTES:
+        if minutes > MAX_NETWORK_MINUTES:
+            poly = circle_polygon(mode.speed_kmh, minutes)
+            method = "circle-approx"
+        else:
+            poly = isochrone_polygon(node_xy[nodes_within(positions, seconds, minutes * 60)], to_wgs)
+            method = "street-network"
+
+        if poly:
+            features.append(
+                {
+                    "type": "Feature",
+                    "geometry": mapping(poly),
+                    "properties": {
+                        "mode": mode.key,
+                        "label": mode.label,
+                        "minutes": minutes,
+                        "speed_kmh": mode.speed_kmh,
+                        "method": method,
+                        "center": "Grand Central Terminal",
+                    },
+                }
+            )
+    return features
+
+
 def main() -> None:
     OUT_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -178,50 +222,47 @@ def main() -> None:
     for mode in MODES:
         networks.setdefault(mode.network, []).append(mode.speed_kmh)
 
+    radii = {}
+    for network_type, speeds in networks.items():
+        radius_m = int(max(speeds) * (MAX_NETWORK_MINUTES / 60) * 1000 * 1.1)
+        radii[network_type] = max(min(radius_m, MAX_GRAPH_RADIUS_M), MIN_GRAPH_RADIUS_M)
+
     graphs = {}
     with tqdm(total=len(networks), desc="Building graphs", unit="graph") as bar:
-        for network_type, speeds in networks.items():
-            max_speed = max(speeds)
-            radius_m = int(max_speed * (MAX_NETWORK_MINUTES / 60) * 1000 * 1.1)
-            radius_m = max(min(radius_m, MAX_GRAPH_RADIUS_M), MIN_GRAPH_RADIUS_M)
+        for network_type, radius_m in radii.items():
             bar.set_postfix_str(f"{network_type} ~{radius_m/1000:.0f}km")
-            graphs[network_type] = build_graph(network_type, radius_m)
+            graphs[network_type] = cached_graph(
+                f"{network_type}_{radius_m}_{CENTER_LAT}_{CENTER_LNG}",
+                lambda: build_graph(network_type, radius_m),
+            )
             bar.update(1)
 
+    # Project each network once; every mode and ring on it reuses the arrays.
+    projected = {network_type: project_nodes(graph) for network_type, graph in graphs.items()}
+    lengths = {network_type: length_csr(graph) for network_type, graph in graphs.items()}
+    centers = {
+        network_type: nearest_node(graph, CENTER_LAT, CENTER_LNG)
+        for network_type, graph in graphs.items()
+    }
+
+    # Modes are independent once the graphs exist: one worker process per mode.
     features = []
-    total_steps = len(MODES) * len(MINUTES)
-    with tqdm(total=total_steps, desc="Isochrones", unit="ring") as bar:
-        for mode in MODES:
-            graph = add_travel_time(graphs[mode.network].copy(), mode.speed_kmh)
-            for minutes in MINUTES:
-                bar.set_postfix_str(f"{mode.key} {minutes}min")
-
-                if minutes > MAX_NETWORK_MINUTES:
-                    poly = circle_polygon(mode.speed_kmh, minutes)
-                    method = "circle-approx"
-                else:
-                    poly = isochrone_polygon(graph, minutes)
-                    method = "street-network"
-
-                if poly:
-                    features.append(
-                        {
-                            "type": "Feature",
-                            "geometry": mapping(poly),
-                            "properties": {
-                                "mode": mode.key,
-                                "label": mode.label,
-                                "minutes": minutes,
-                                "speed_kmh": mode.speed_kmh,
-                                "method": method,
-                                "center": "Grand Central Terminal",
-                            },
-                        }
-                    )
-                bar.update(1)
+    with ProcessPoolExecutor(max_workers=ISOCHRONE_WORKERS) as executor:
+        jobs = [
+            executor.submit(
+                mode_features,
+                mode,
+                lengths[mode.network],
+                centers[mode.network],
+                *projected[mode.network],
+            )
+            for mode in MODES
+        ]
+        for job in tqdm(jobs, desc="Isochrones", unit="mode"):
+            features.extend(job.result())
 
     geojson = {"type": "FeatureCollection", "features": features}
-    OUT_FILE.write_text(json.dumps(geojson))
+    write_geojson(OUT_FILE, geojson)
     print(f"Wrote {OUT_FILE}")
 
 
@@ -11,10 +11,22 @@ except ImportError:  # pragma: no cover - fallback when tqdm is unavailable
         return iterable if iterable is not None else []
 
 import networkx as nx
+import numpy as np
 import osmnx as ox
+import shapely
 from pyproj import Transformer
-from shapely.geometry import MultiPoint
-from shapely.ops import transform as geom_transform
+from scipy.spatial import cKDTree
+
+from geojson_io import write_geojson
+from isochrone_graph import (
+    add_edge_lengths_safe,
+    cached_graph,
+    length_csr,
+    nodes_within,
+    reachable_times,
+    transform_geometry,
+    travel_time_csr,
+)
 
 
 OUT_DIR = Path("web/data/processed/isochrones")
@@ -33,6 +45,15 @@ POINTS_PER_RING = 96
 
 EARTH_RADIUS_M = 6_371_000.0
 
+# Margin on the speed * cutoff pruning radius (projected vs geodesic edge lengths)
+RADIUS_SLACK = 1.05
+
+# Segments per quarter circle of each node buffer (MultiPoint.buffer used 16)
+BUFFER_QUAD_SEGS = 4
+
+# Simplification tolerance (meters, projected) applied to each merged ring
+SIMPLIFY_TOLERANCE_M = 5.0
+
 MODE_CIRCLES = {
     "walking": 4.8,
     "cycling": 15.0,
@@ -58,33 +79,23 @@ MODE_NETWORKS = {
 
 
 def ring_coordinates(lat: float, lng: float, radius_m: float) -> list[list[float]]:
-    coords = []
     lat_rad = math.radians(lat)
     lng_rad = math.radians(lng)
     angular = radius_m / EARTH_RADIUS_M
+    sin_lat = math.sin(lat_rad)
+    cos_lat = math.cos(lat_rad)
+    sin_ang = math.sin(angular)
+    cos_ang = math.cos(angular)
+
+    # Whole ring at once with NumPy ufuncs instead of a per-vertex math loop.
+    bearing = 2 * np.pi * (np.arange(POINTS_PER_RING + 1) / POINTS_PER_RING)
+    lat2 = np.arcsin(sin_lat * cos_ang + cos_lat * sin_ang * np.cos(bearing))
+    lng2 = lng_rad + np.arctan2(
+        np.sin(bearing) * sin_ang * cos_lat,
+        cos_ang - sin_lat * np.sin(lat2),
+    )
 
-    for i in range(POINTS_PER_RING + 1):
-        bearing = 2 * math.pi * (i / POINTS_PER_RING)
-        sin_lat = math.sin(lat_rad)
-        cos_lat = math.cos(lat_rad)
-        sin_ang = math.sin(angular)
-        cos_ang = math.cos(angular)
-
-        lat2 = math.asin(sin_lat * cos_ang + cos_lat * sin_ang * math.cos(bearing))
-        lng2 = lng_rad + math.atan2(
-            math.sin(bearing) * sin_ang * cos_lat,
-            cos_ang - sin_lat * math.sin(lat2),
-        )
-
-        coords.append([math.degrees(lng2), math.degrees(lat2)])
-
-    return coords
-
-
-def add_edge_lengths_safe(graph: nx.MultiDiGraph) -> nx.MultiDiGraph:
-    if hasattr(ox, "add_edge_lengths"):
-        return ox.add_edge_lengths(graph)
-    return ox.distance.add_edge_lengths(graph)
+    return np.column_stack([np.degrees(lng2), np.degrees(lat2)]).tolist()
 
 
 def build_drive_graph(radius_m: int) -> nx.MultiDiGraph:
@@ -100,111 +111,56 @@ def build_drive_graph(radius_m: int) -> nx.MultiDiGraph:
     return add_edge_lengths_safe(graph)
 
 
-def add_travel_time(graph: nx.MultiDiGraph, speed_kmh: float) -> nx.MultiDiGraph:
-    speed_m_s = speed_kmh * 1000 / 3600
-    for _, _, _, data in graph.edges(keys=True, data=True):
-        length = data.get("length", 0)
-        data["travel_time"] = length / speed_m_s if speed_m_s > 0 else 0
-    return graph
-
-
-def load_points(path: Path) -> list[tuple[float, float]]:
+def load_points(path: Path) -> np.ndarray:
+    """(N, 2) lng/lat of every point feature, parsed by GEOS in one call."""
     if not path.exists():
         raise SystemExit(f"Missing GeoJSON file: {path}")
-    data = json.loads(path.read_text())
-    points = []
-    for feature in data.get("features", []):
-        coords = feature.get("geometry", {}).get("coordinates")
-        if not coords:
-            continue
-        lng, lat = coords[:2]
-        points.append((lat, lng))
-    return points
-
-
-def station_grid(
-    stations_xy: list[tuple[float, float]],
-    cell_size: float,
-) -> dict[tuple[int, int], list[tuple[float, float]]]:
-    grid: dict[tuple[int, int], list[tuple[float, float]]] = {}
-    for x, y in stations_xy:
-        cell = (int(x // cell_size), int(y // cell_size))
-        grid.setdefault(cell, []).append((x, y))
-    return grid
+    parts = shapely.get_parts(shapely.from_geojson(path.read_bytes()))
+    points = parts[(shapely.get_type_id(parts) == 0) & ~shapely.is_empty(parts)]
+    return shapely.get_coordinates(points)
 
 
 def nodes_near_stations(
-    graph_proj: nx.MultiDiGraph,
-    stations_xy: list[tuple[float, float]],
+    node_ids: np.ndarray,
+    node_xy: np.ndarray,
+    stations_xy: np.ndarray,
     stop_buffer_m: float,
     center_xy: tuple[float, float],
     start_buffer_m: float,
+    max_radius_m: float,
 ) -> set[int]:
-    if not stations_xy:
+    if len(stations_xy) == 0 or len(node_ids) == 0:
         return set()
 
-    grid = station_grid(stations_xy, stop_buffer_m)
-    allowed: set[int] = set()
-    stop_buffer_sq = stop_buffer_m ** 2
-    start_buffer_sq = start_buffer_m ** 2
+    center_dist2 = ((node_xy - np.asarray(center_xy)) ** 2).sum(axis=1)
 
-    for node_id, data in tqdm(graph_proj.nodes(data=True), desc="Filtering nodes", leave=False):
-        x = data.get("x")
-        y = data.get("y")
-        if x is None or y is None:
-            continue
+    # A path is never shorter than the straight line, so nodes beyond
+    # speed * cutoff can't be reached; drop them before the subgraph is built.
+    in_range = center_dist2 <= max_radius_m**2
+    node_xy, node_ids, center_dist2 = node_xy[in_range], node_ids[in_range], center_dist2[in_range]
 
-        dx_center = x - center_xy[0]
-        dy_center = y - center_xy[1]
-        if dx_center * dx_center + dy_center * dy_center <= start_buffer_sq:
-            allowed.add(node_id)
-            continue
+    tree = cKDTree(stations_xy)
+    near_stop = tree.query_ball_point(node_xy, r=stop_buffer_m, return_length=True) > 0
+    near_center = center_dist2 <= start_buffer_m**2
 
-        cell = (int(x // stop_buffer_m), int(y // stop_buffer_m))
-        found = False
-        for dx in (-1, 0, 1):
-            for dy in (-1, 0, 1):
-                for sx, sy in grid.get((cell[0] + dx, cell[1] + dy), []):
-                    dx_stop = x - sx
-                    dy_stop = y - sy
-                    if dx_stop * dx_stop + dy_stop * dy_stop <= stop_buffer_sq:
-                        allowed.add(node_id)
-                        found = True
-                        break
-                if found:
-                    break
-            if found:
-                break
-
-    return allowed
+    return set(node_ids[near_stop | near_center].tolist())
 
 
 def isochrone_polygon(
-    graph_proj: nx.MultiDiGraph,
-    center_node: int,
-    minutes: int,
+    node_xy: np.ndarray,
     buffer_m: float,
     transformer: Transformer,
 ) -> dict | None:
-    cutoff = minutes * 60
-    lengths = nx.single_source_dijkstra_path_length(
-        graph_proj,
-        center_node,
-        cutoff=cutoff,
-        weight="travel_time",
-    )
-    if not lengths:
+    if len(node_xy) == 0:
         return None
 
-    points = [
-        (graph_proj.nodes[node]["x"], graph_proj.nodes[node]["y"])
-        for node in lengths.keys()
-    ]
-    merged = MultiPoint(points).buffer(buffer_m)
+    points = shapely.points(node_xy[:, 0], node_xy[:, 1])
+    merged = shapely.unary_union(shapely.buffer(points, buffer_m, quad_segs=BUFFER_QUAD_SEGS))
     if merged.is_empty:
         return None
 
-    geo_shape = geom_transform(transformer.transform, merged)
+    merged = shapely.simplify(merged, SIMPLIFY_TOLERANCE_M, preserve_topology=True)
+    geo_shape = transform_geometry(merged, transformer)
     return geo_shape.__geo_interface__
 
 
@@ -242,47 +198,56 @@ def main() -> None:
     radius_m = max(12_000, min(radius_m, 24_000))
 
     with tqdm(total=1, desc="Downloading drive network", unit="graph") as bar:
-        base_graph = build_drive_graph(radius_m)
+        graph_proj = cached_graph(
+            f"drive_projected_{radius_m}_{CENTER_LAT}_{CENTER_LNG}",
+            lambda: ox.project_graph(build_drive_graph(radius_m)),
+        )
         bar.update(1)
 
-    graph_proj = ox.project_graph(base_graph)
     crs = graph_proj.graph.get("crs", "EPSG:3857")
     transformer_to_proj = Transformer.from_crs("EPSG:4326", crs, always_xy=True)
     transformer_to_wgs = Transformer.from_crs(crs, "EPSG:4326", always_xy=True)
     center_x, center_y = transformer_to_proj.transform(CENTER_LNG, CENTER_LAT)
 
+    # Node coordinates are read from the graph once; modes index into these arrays.
+    graph_ids = np.asarray(list(graph_proj.nodes))
+    graph_xy = np.array(
+        [(data["x"], data["y"]) for _, data in graph_proj.nodes(data=True)], dtype=np.float64
+    ).reshape(-1, 2)
+    id_order = np.argsort(graph_ids)
+
     for mode, config in tqdm(MODE_NETWORKS.items(), desc="Building network modes"):
-        points = load_points(config["source"])
-        if not points:
+        lng_lat = load_points(config["source"])
+        if len(lng_lat) == 0:
             continue
 
-        stops_xy = [transformer_to_proj.transform(lng, lat) for lat, lng in points]
+        stops_xy = np.column_stack(transformer_to_proj.transform(lng_lat[:, 0], lng_lat[:, 1]))
         allowed_nodes = nodes_near_stations(
-            graph_proj,
+            graph_ids,
+            graph_xy,
             stops_xy,
             config["stop_buffer_m"],
             (center_x, center_y),
             config["start_buffer_m"],
+            config["speed_kmh"] / 3.6 * max(MINUTES) * 60 * RADIUS_SLACK,
         )
         if not allowed_nodes:
             continue
 
-        subgraph = graph_proj.subgraph(allowed_nodes).copy()
-        add_travel_time(subgraph, config["speed_kmh"])
+        subgraph = graph_proj.subgraph(allowed_nodes)
 
-        center_node = min(
-            subgraph.nodes,
-            key=lambda node: math.hypot(
-                subgraph.nodes[node]["x"] - center_x,
-                subgraph.nodes[node]["y"] - center_y,
-            ),
-        )
+        csr = travel_time_csr(length_csr(subgraph), config["speed_kmh"])
+        node_xy = graph_xy[id_order[np.searchsorted(graph_ids, csr[0], sorter=id_order)]]
+        center_node = csr[0][
+            np.argmin((node_xy[:, 0] - center_x) ** 2 + (node_xy[:, 1] - center_y) ** 2)
+        ]
+
+        # One Dijkstra run up to the largest cutoff; smaller rings are prefixes.
+        positions, seconds = reachable_times(csr, center_node, max(MINUTES) * 60)
 
         for minutes in tqdm(MINUTES, desc=f"{mode} rings", leave=False):
             geometry = isochrone_polygon(
-                subgraph,
-                center_node,
-                minutes,
+                node_xy[nodes_within(positions, seconds, minutes * 60)],
                 config["buffer_m"],
                 transformer_to_wgs,
             )
@@ -303,7 +268,7 @@ def main() -> None:
             )
 
     geojson = {"type": "FeatureCollection", "features": features}
-    OUT_FILE.write_text(json.dumps(geojson))
+    write_geojson(OUT_FILE, geojson)
     print(f"Wrote {OUT_FILE}")
 
 
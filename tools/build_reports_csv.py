@@ -3,7 +3,9 @@ from __future__ import annotations
 import re
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+from openpyxl import load_workbook
 
 
 RAW_DIR = Path("data/raw_reports")
@@ -11,25 +13,49 @@ OUT_DIR = Path("data/processed")
 OUT_FILE = OUT_DIR / "unreadable_license_plates.csv"
 
 
+# Case-insensitive, so the filename doesn't need lowering first
+QUARTER_RE = re.compile(r"(?i)q[1-4]-\d{4}")
+
 DAY_LABELS = {"SUN", "MON", "TUE", "WED", "THU", "FRI", "SAT"}
 
+# Text cells read_excel turned into NaN (pandas' default NA tokens + Excel errors)
+NA_STRINGS = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND",
+    "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+    "#NULL!", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!",
+}
+
+
+def is_missing(value: object) -> bool:
+    # Scalar pd.isna for Excel cells: empty cells come back as None or float NaN.
+    return value is None or value != value
+
 
 def normalize_cell(value: object) -> str:
-    if pd.isna(value):
+    if is_missing(value):
         return ""
     return str(value).strip()
 
 
 def extract_quarter(filename: str) -> str:
-    match = re.search(r"q[1-4]-\d{4}", filename.lower())
+    match = QUARTER_RE.search(filename)
     return match.group(0).upper() if match else "UNKNOWN"
 
 
-def extract_metadata(df: pd.DataFrame) -> tuple[str, str]:
+def concat_frames(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    # A single frame is returned as-is: pd.concat would copy it for nothing.
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+def extract_metadata(arr: np.ndarray) -> tuple[str, str]:
     vio_type = "Unknown"
     month = "Unknown"
-    for idx in range(min(6, len(df))):
-        cell = normalize_cell(df.iat[idx, 0])
+    for idx in range(min(6, len(arr))):
+        cell = normalize_cell(arr[idx, 0])
         if cell.upper().startswith("VIO TYPE"):
             parts = cell.split(":", 1)
             if len(parts) == 2:
@@ -41,190 +67,183 @@ def extract_metadata(df: pd.DataFrame) -> tuple[str, str]:
     return vio_type, month
 
 
-def find_row(df: pd.DataFrame, label: str) -> int | None:
+def find_row(arr: np.ndarray, label: str) -> int | None:
     label_lower = label.lower()
-    for idx, value in df[0].items():
+    for idx, value in enumerate(arr[:, 0]):
         cell = normalize_cell(value).lower()
         if label_lower in cell:
             return idx
     return None
 
 
-def parse_day_of_week(df: pd.DataFrame, start_row: int, meta: dict) -> list[dict]:
-    header_row = None
-    for idx in range(start_row, min(start_row + 6, len(df))):
-        if normalize_cell(df.iat[idx, 0]) == "Reject Reason":
-            header_row = idx
+LABEL_COLUMNS = ["day", "time_window", "borough", "community_board"]
+
+
+def long_counts(
+    arr: np.ndarray,
+    header_row: int,
+    labels_by_col: dict[int, dict[str, str]],
+    section: str,
+    meta: dict,
+) -> pd.DataFrame:
+    """Reject-reason rows x labelled columns of one block, as long-format non-empty counts."""
+    rows: list[int] = []
+    reasons: list[str] = []
+    for idx in range(header_row + 1, len(arr)):
+        reason = normalize_cell(arr[idx, 0])
+        if not reason:
             break
+        if reason.lower() == "reject reason":
+            continue
+        rows.append(idx)
+        reasons.append(reason)
+
+    cols = list(labels_by_col)
+    values = arr[np.ix_(np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp))]
+    # nonzero walks the block row-major: same record order as the old nested loops.
+    row_pos, col_pos = np.nonzero(~pd.isna(values))
+    labels = {
+        name: np.array([labels_by_col[col].get(name, "") for col in cols], dtype=object)[col_pos]
+        for name in LABEL_COLUMNS
+    }
+    return pd.DataFrame(
+        {
+            **meta,
+            "section": section,
+            "reject_reason": np.array(reasons, dtype=object)[row_pos],
+            **labels,
+            "count": values[row_pos, col_pos].astype(np.int64),
+        }
+    )
+
+
+def find_header_row(arr: np.ndarray, start_row: int, window: int) -> int | None:
+    for idx in range(start_row, min(start_row + window, len(arr))):
+        if normalize_cell(arr[idx, 0]) == "Reject Reason":
+            return idx
+    return None
+
+
+def parse_day_of_week(arr: np.ndarray, start_row: int, meta: dict) -> pd.DataFrame | None:
+    header_row = find_header_row(arr, start_row, 6)
     if header_row is None:
-        return []
+        return None
 
     day_row = header_row - 1
     day_by_col: dict[int, str] = {}
     current_day = ""
-    for col in range(1, df.shape[1]):
-        day_value = normalize_cell(df.iat[day_row, col]).upper()
+    for col in range(1, arr.shape[1]):
+        day_value = normalize_cell(arr[day_row, col]).upper()
         if day_value in DAY_LABELS:
             current_day = day_value
         if current_day:
             day_by_col[col] = current_day
 
-    time_by_col: dict[int, str] = {}
-    for col in range(1, df.shape[1]):
-        time_value = normalize_cell(df.iat[header_row, col])
+    labels_by_col = {}
+    for col, day in day_by_col.items():
+        time_value = normalize_cell(arr[header_row, col])
         if time_value:
-            time_by_col[col] = time_value
+            labels_by_col[col] = {"day": day, "time_window": time_value}
+    return long_counts(arr, header_row, labels_by_col, "day_of_week", meta)
 
-    records: list[dict] = []
-    for idx in range(header_row + 1, len(df)):
-        reason = normalize_cell(df.iat[idx, 0])
-        if not reason:
-            break
-        if reason.lower() == "reject reason":
-            continue
-        for col, day in day_by_col.items():
-            if col not in time_by_col:
-                continue
-            value = df.iat[idx, col]
-            if pd.isna(value):
-                continue
-            records.append(
-                {
-                    **meta,
-                    "section": "day_of_week",
-                    "reject_reason": reason,
-                    "day": day,
-                    "time_window": time_by_col[col],
-                    "borough": "",
-                    "community_board": "",
-                    "count": int(value),
-                }
-            )
-    return records
-
-
-def parse_borough(df: pd.DataFrame, start_row: int, meta: dict) -> list[dict]:
-    header_row = None
-    for idx in range(start_row, min(start_row + 4, len(df))):
-        if normalize_cell(df.iat[idx, 0]) == "Reject Reason":
-            header_row = idx
-            break
+
+def parse_borough(arr: np.ndarray, start_row: int, meta: dict) -> pd.DataFrame | None:
+    header_row = find_header_row(arr, start_row, 4)
     if header_row is None:
-        return []
+        return None
 
-    borough_by_col = {}
-    for col in range(1, df.shape[1]):
-        name = normalize_cell(df.iat[header_row, col])
+    labels_by_col = {}
+    for col in range(1, arr.shape[1]):
+        name = normalize_cell(arr[header_row, col])
         if name:
-            borough_by_col[col] = name.title()
+            labels_by_col[col] = {"borough": name.title()}
+    return long_counts(arr, header_row, labels_by_col, "borough", meta)
 
-    records: list[dict] = []
-    for idx in range(header_row + 1, len(df)):
-        reason = normalize_cell(df.iat[idx, 0])
-        if not reason:
-            break
-        if reason.lower() == "reject reason":
-            continue
-        for col, borough in borough_by_col.items():
-            value = df.iat[idx, col]
-            if pd.isna(value):
-                continue
-            records.append(
-                {
-                    **meta,
-                    "section": "borough",
-                    "reject_reason": reason,
-                    "day": "",
-                    "time_window": "",
-                    "borough": borough,
-                    "community_board": "",
-                    "count": int(value),
-                }
-            )
-    return records
-
-
-def parse_community_board(df: pd.DataFrame, start_row: int, meta: dict) -> list[dict]:
-    header_row = None
-    for idx in range(start_row, min(start_row + 4, len(df))):
-        if normalize_cell(df.iat[idx, 0]) == "Reject Reason":
-            header_row = idx
-            break
+
+def parse_community_board(arr: np.ndarray, start_row: int, meta: dict) -> pd.DataFrame | None:
+    header_row = find_header_row(arr, start_row, 4)
     if header_row is None:
-        return []
+        return None
 
-    board_by_col = {}
-    for col in range(1, df.shape[1]):
-        label = normalize_cell(df.iat[header_row, col])
+    labels_by_col = {}
+    for col in range(1, arr.shape[1]):
+        label = normalize_cell(arr[header_row, col])
         if label:
-            board_by_col[col] = " ".join(label.split())
+            labels_by_col[col] = {"community_board": " ".join(label.split())}
+    return long_counts(arr, header_row, labels_by_col, "community_board", meta)
 
-    records: list[dict] = []
-    for idx in range(header_row + 1, len(df)):
-        reason = normalize_cell(df.iat[idx, 0])
-        if not reason:
-            break
-        if reason.lower() == "reject reason":
-            continue
-        for col, board in board_by_col.items():
-            value = df.iat[idx, col]
-            if pd.isna(value):
-                continue
-            records.append(
-                {
-                    **meta,
-                    "section": "community_board",
-                    "reject_reason": reason,
-                    "day": "",
-                    "time_window": "",
-                    "borough": "",
-                    "community_board": board,
-                    "count": int(value),
-                }
-            )
-    return records
-
-
-def parse_month_sheet(df: pd.DataFrame, meta: dict) -> list[dict]:
-    records: list[dict] = []
-
-    day_row = find_row(df, "Day Of Week - Rejects")
+
+def parse_month_sheet(arr: np.ndarray, meta: dict) -> list[pd.DataFrame]:
+    frames: list[pd.DataFrame | None] = []
+
+    day_row = find_row(arr, "Day Of Week - Rejects")
     if day_row is not None:
-        records.extend(parse_day_of_week(df, day_row, meta))
+        frames.append(parse_day_of_week(arr, day_row, meta))
 
-    borough_row = find_row(df, "Borough - Rejects")
+    borough_row = find_row(arr, "Borough - Rejects")
     if borough_row is not None:
-        records.extend(parse_borough(df, borough_row, meta))
+        frames.append(parse_borough(arr, borough_row, meta))
 
-    board_row = find_row(df, "Community Board - Rejects")
+    board_row = find_row(arr, "Community Board - Rejects")
     if board_row is not None:
-        records.extend(parse_community_board(df, board_row, meta))
+        frames.append(parse_community_board(arr, board_row, meta))
+
+    return [frame for frame in frames if frame is not None and not frame.empty]
+
+
+def convert_cell(value: object) -> object:
+    # Same cell values read_excel produced: integral floats as int, NA text as None.
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value in NA_STRINGS:
+        return None
+    return value
 
-    return records
+
+def read_sheet(sheet) -> np.ndarray:
+    """Cell values of a read-only worksheet as a 2D object array (None when empty)."""
+    sheet.reset_dimensions()
+    rows = []
+    last_row_with_data = -1
+    for row in sheet.iter_rows(values_only=True):
+        values = [convert_cell(value) for value in row]
+        while values and values[-1] is None:
+            values.pop()
+        if values:
+            last_row_with_data = len(rows)
+        rows.append(values)
+    rows = rows[: last_row_with_data + 1]
+
+    arr = np.full((len(rows), max(map(len, rows), default=0)), None, dtype=object)
+    for idx, values in enumerate(rows):
+        arr[idx, : len(values)] = values
+    return arr
 
 
 def read_report(path: Path) -> pd.DataFrame:
-    xls = pd.ExcelFile(path)
+    # Read-only, values-only workbook: no styles, no per-sheet DataFrame/type inference.
+    workbook = load_workbook(path, read_only=True, data_only=True)
     frames = []
-    for sheet_name in xls.sheet_names:
-        if sheet_name.lower().startswith("reject category"):
-            continue
-        df = pd.read_excel(xls, sheet_name=sheet_name, header=None)
-        vio_type, month = extract_metadata(df)
-        meta = {
-            "source_file": path.name,
-            "quarter": extract_quarter(path.name),
-            "sheet": sheet_name,
-            "month": month,
-            "violation_type": vio_type,
-        }
-        records = parse_month_sheet(df, meta)
-        if records:
-            frames.append(pd.DataFrame(records))
+    try:
+        for sheet in workbook.worksheets:
+            if sheet.title.lower().startswith("reject category"):
+                continue
+            arr = read_sheet(sheet)
+            if arr.size == 0:
+                continue
+            vio_type, month = extract_metadata(arr)
+            meta = {
+                "source_file": path.name,
+                "quarter": extract_quarter(path.name),
+                "sheet": sheet.title,
+                "month": month,
+                "violation_type": vio_type,
+            }
+            frames.extend(parse_month_sheet(arr, meta))
+    finally:
+        workbook.close()
 
-    if not frames:
-        return pd.DataFrame()
-    return pd.concat(frames, ignore_index=True)
+    return concat_frames(frames)
 
 
 def main() -> None:
@@ -238,7 +257,7 @@ def main() -> None:
         if not frame.empty:
             frames.append(frame)
 
-    combined = pd.concat(frames, ignore_index=True)
+    combined = concat_frames(frames)
     OUT_DIR.mkdir(parents=True, exist_ok=True)
     combined.to_csv(OUT_FILE, index=False)
 
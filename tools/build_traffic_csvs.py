@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
 
@@ -14,31 +15,93 @@ OUT_DIR = Path("web/data/processed/traffic")
 
 CHUNK_SIZE = 250_000
 
+# Days since 1970-01-01 that fit a pandas (ns) Timestamp
+MIN_DAY = (pd.Timestamp.min.ceil("D") - pd.Timestamp(0)).days
+MAX_DAY = (pd.Timestamp.max.floor("D") - pd.Timestamp(0)).days
 
-def normalize_direction(value: str) -> str:
-    value = str(value).strip().upper()
-    return value if value else "UNK"
+# Text columns repeat a few thousand values: parse them as categoricals.
+# Numeric columns keep the default inference (they can hold NaN until dropna).
+CATEGORY_COLUMNS = ["Boro", "street", "fromSt", "toSt", "Direction"]
 
+# Narrow ints for the group keys and volumes once NaN rows are gone
+# (hours/months fit int8, a single count fits int32; sums stay int64).
+# Applied per column only when every value is integral and in range.
+NUMERIC_DTYPES = {"HH": np.int8, "M": np.int8, "Vol": np.int32}
 
-def normalize_boro(value: str) -> str:
-    return str(value).strip().title()
 
+def narrow_numeric(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Downcast the NUMERIC_DTYPES columns that convert losslessly; keep the rest as read."""
+    dtypes = {}
+    for column, dtype in NUMERIC_DTYPES.items():
+        values = chunk[column]
+        limits = np.iinfo(dtype)
+        if ((values % 1 == 0) & values.between(limits.min, limits.max)).all():
+            dtypes[column] = dtype
+    return chunk.astype(dtypes)
 
-def make_corridor(row: pd.Series) -> str:
-    street = str(row.get("street", "")).strip()
-    from_st = str(row.get("fromSt", "")).strip()
-    to_st = str(row.get("toSt", "")).strip()
-    direction = normalize_direction(row.get("Direction", ""))
-    parts = [p for p in [street, from_st, to_st, direction] if p]
-    return " | ".join(parts) if parts else "Unknown"
 
+def normalize_direction(values: pd.Series) -> pd.Series:
+    values = values.astype(str).str.strip().str.upper()
+    return values.where(values != "", "UNK")
 
-def update_sum_count(target: pd.DataFrame, chunk_grouped: pd.DataFrame) -> pd.DataFrame:
-    if target.empty:
-        return chunk_grouped.copy()
-    combined = pd.concat([target, chunk_grouped])
-    combined = combined.groupby(list(chunk_grouped.index.names), as_index=True).sum()
-    return combined
+
+def normalize_boro(values: pd.Series) -> pd.Series:
+    return values.astype(str).str.strip().str.title()
+
+
+def strip_text(values: pd.Series) -> pd.Series:
+    return values.astype(str).str.strip()
+
+
+def by_category(values: pd.Series, normalize) -> pd.Series:
+    """Run a Series normalizer once per category and expand it to rows by code."""
+    # Missing rows have code -1: the trailing "nan" entry, as str(NaN) rendered it.
+    categories = pd.Series([*values.cat.categories.astype(str), "nan"], dtype=object)
+    lookup = normalize(categories).to_numpy()
+    return pd.Series(lookup[values.cat.codes.to_numpy()], index=values.index)
+
+
+def make_corridor(chunk: pd.DataFrame) -> pd.Series:
+    """"street | fromSt | toSt | Direction" per row, skipping empty parts."""
+    # Direction is already normalized.
+    parts = [by_category(chunk[column], strip_text) for column in ("street", "fromSt", "toSt")]
+    parts.append(chunk["Direction"])
+
+    corridor = pd.Series("", index=chunk.index, dtype=object)
+    for part in parts:
+        sep = np.where((corridor != "") & (part != ""), " | ", "")
+        corridor = corridor + sep + part
+    return corridor.where(corridor != "", "Unknown")
+
+
+def weekday_index(chunk: pd.DataFrame) -> np.ndarray:
+    """Monday=0 weekday of each Yr/M/D row (-1 where the date doesn't exist)."""
+    ymd = chunk[["Yr", "M", "D"]].to_numpy(dtype=np.float64)
+    # pd.to_datetime(dict(...)) assembled Yr*10000 + M*100 + D and parsed the truncated
+    # number as %Y%m%d: fractional parts carry over the same way here.
+    stamp = ymd[:, 0] * 10000 + ymd[:, 1] * 100 + ymd[:, 2]
+    valid = np.isfinite(stamp) & (stamp >= 1677_00_00) & (stamp < 2263_00_00)
+    stamp = np.trunc(np.where(valid, stamp, 1970_01_01)).astype(np.int64)
+    ymd = np.column_stack([stamp // 10000, stamp // 100 % 100, stamp % 100])
+    # Real months/days only; day-of-month and ns-range limits are checked below.
+    valid &= (ymd[:, 1] >= 1) & (ymd[:, 1] <= 12) & (ymd[:, 2] >= 1)
+
+    months = ((ymd[:, 0] - 1970) * 12 + ymd[:, 1] - 1).astype("datetime64[M]")
+    first_day = months.astype("datetime64[D]").astype(np.int64)
+    days_in_month = (months + 1).astype("datetime64[D]").astype(np.int64) - first_day
+    days = first_day + ymd[:, 2] - 1
+    valid &= (ymd[:, 2] <= days_in_month) & (days >= MIN_DAY) & (days <= MAX_DAY)
+
+    # Day 0 (1970-01-01) was a Thursday.
+    return np.where(valid, (days + 3) % 7, -1)
+
+
+def sum_parts(parts: list[pd.DataFrame]) -> pd.DataFrame:
+    # One concat + groupby over every chunk's partial sums (not one per chunk).
+    if not parts:
+        return pd.DataFrame()
+    combined = pd.concat(parts)
+    return combined.groupby(list(combined.index.names), as_index=True).sum()
 
 
 def resolve_raw_files() -> list[Path]:
@@ -59,77 +122,78 @@ def main() -> None:
 
     OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-    hourly = pd.DataFrame()
-    monthly = pd.DataFrame()
-    weekday = pd.DataFrame()
-    direction = pd.DataFrame()
-    day_of_week = pd.DataFrame()
-    borough_share = pd.DataFrame()
-    corridor = pd.Series(dtype="float64")
+    hourly_parts: list[pd.DataFrame] = []
+    monthly_parts: list[pd.DataFrame] = []
+    weekday_parts: list[pd.DataFrame] = []
+    direction_parts: list[pd.DataFrame] = []
+    day_of_week_parts: list[pd.DataFrame] = []
+    borough_share_parts: list[pd.DataFrame] = []
+    corridor_parts: list[pd.DataFrame] = []
 
     usecols = ["Boro", "Yr", "M", "D", "HH", "Vol", "street", "fromSt", "toSt", "Direction"]
 
     for raw_file in raw_files:
-        for chunk in pd.read_csv(raw_file, usecols=usecols, chunksize=CHUNK_SIZE):
+        dtypes = {column: "category" for column in CATEGORY_COLUMNS}
+        for chunk in pd.read_csv(raw_file, usecols=usecols, dtype=dtypes, chunksize=CHUNK_SIZE):
             chunk = chunk.dropna(subset=["Boro", "Yr", "M", "D", "HH", "Vol"])
-            chunk = chunk[chunk["Vol"] >= 0]
+            chunk = narrow_numeric(chunk[chunk["Vol"] >= 0])
 
-            chunk["Boro"] = chunk["Boro"].map(normalize_boro)
-            chunk["Direction"] = chunk["Direction"].map(normalize_direction)
+            chunk["Boro"] = by_category(chunk["Boro"], normalize_boro)
+            chunk["Direction"] = by_category(chunk["Direction"], normalize_direction)
 
-            dates = pd.to_datetime(
-                dict(year=chunk["Yr"], month=chunk["M"], day=chunk["D"]),
-                errors="coerce",
-            )
-            chunk = chunk[dates.notna()].copy()
-            chunk["weekday"] = dates.dt.dayofweek
+            weekday = weekday_index(chunk)
+            valid = weekday >= 0
+            chunk = chunk[valid].copy()
+            chunk["weekday"] = weekday[valid]
             chunk["is_weekend"] = chunk["weekday"] >= 5
 
             hour_group = (
                 chunk.groupby(["Boro", "HH"])["Vol"]
                 .agg(volume_sum="sum", volume_count="count")
-                .sort_index()
             )
-            hourly = update_sum_count(hourly, hour_group)
+            hourly_parts.append(hour_group)
 
             month_group = (
                 chunk.groupby(["Boro", "M"])["Vol"]
                 .agg(volume_sum="sum", volume_count="count")
-                .sort_index()
             )
-            monthly = update_sum_count(monthly, month_group)
+            monthly_parts.append(month_group)
 
             weekday_group = (
                 chunk.groupby(["Boro", "is_weekend"])["Vol"]
                 .agg(volume_sum="sum", volume_count="count")
-                .sort_index()
             )
-            weekday = update_sum_count(weekday, weekday_group)
+            weekday_parts.append(weekday_group)
 
             borough_share_group = (
                 chunk.groupby(["Boro"])["Vol"]
                 .agg(volume_sum="sum", volume_count="count")
-                .sort_index()
             )
-            borough_share = update_sum_count(borough_share, borough_share_group)
+            borough_share_parts.append(borough_share_group)
 
             direction_group = (
                 chunk.groupby(["Boro", "Direction"])["Vol"]
                 .agg(volume_sum="sum", volume_count="count")
-                .sort_index()
             )
-            direction = update_sum_count(direction, direction_group)
+            direction_parts.append(direction_group)
 
             day_group = (
                 chunk.groupby(["weekday"])["Vol"]
                 .agg(volume_sum="sum", volume_count="count")
-                .sort_index()
             )
-            day_of_week = update_sum_count(day_of_week, day_group)
+            day_of_week_parts.append(day_group)
+
+            chunk["corridor"] = make_corridor(chunk)
+            corridor_group = chunk.groupby("corridor")[["Vol"]].sum()
+            corridor_parts.append(corridor_group)
 
-            chunk["corridor"] = chunk.apply(make_corridor, axis=1)
-            corridor_group = chunk.groupby("corridor")["Vol"].sum()
-            corridor = corridor.add(corridor_group, fill_value=0)
+    hourly = sum_parts(hourly_parts)
+    monthly = sum_parts(monthly_parts)
+    weekday = sum_parts(weekday_parts)
+    direction = sum_parts(direction_parts)
+    day_of_week = sum_parts(day_of_week_parts)
+    borough_share = sum_parts(borough_share_parts)
+    corridor = sum_parts(corridor_parts)
 
     hourly_out = (
         hourly.reset_index()
@@ -176,11 +240,11 @@ def main() -> None:
     )
     borough_share_out.to_csv(OUT_DIR / "borough_share.csv", index=False)
 
+    # Only the top 15 are exported: partial selection instead of a full sort.
     top_corridors = (
-        corridor.sort_values(ascending=False)
-        .head(15)
+        corridor["Vol"].nlargest(15)
         .reset_index()
-        .rename(columns={"index": "corridor", 0: "total_volume"})
+        .rename(columns={"Vol": "total_volume"})
     )
     top_corridors.to_csv(OUT_DIR / "top_corridors.csv", index=False)
 
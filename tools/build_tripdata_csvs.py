@@ -1,11 +1,16 @@
 from __future__ import annotations
 
-import sqlite3
-from collections import defaultdict
+import os
+import re
 import shutil
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from tqdm import tqdm
 
 INPUT_DIR = Path("data/tripdata")
@@ -13,8 +18,19 @@ OUT_DIR = Path("data/processed/tripdata")
 WEB_OUT_DIR = Path("web/data/processed/tripdata")
 
 CHUNK_SIZE = 400_000
+ARROW_BLOCK_BYTES = 64 << 20
+# Processi worker (uno per file mensile)
+WORKERS = int(os.environ.get("TRIPDATA_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Anni da elaborare, es. TRIPDATA_YEARS=2023,2024 (vuoto = tutti)
+YEARS = {int(year) for year in os.environ.get("TRIPDATA_YEARS", "").split(",") if year.strip()}
+YEAR_RE = re.compile(r"(20\d\d)")
 TOP_FLOWS = 50
 TOP_STATIONS = 20
+# Aggregati flows/stations per file accumulati prima di ridurli a uno
+COMPACT_FILES = 12
+
+FLOW_KEYS = ["start_station_id", "end_station_id"]
+STATION_KEYS = ["start_station_id"]
 
 USECOLS = [
     "ride_id",
@@ -32,6 +48,51 @@ USECOLS = [
     "member_casual",
 ]
 
+# Righe senza questi campi vengono scartate
+REQUIRED_COLUMNS = [
+    "started_at",
+    "ended_at",
+    "start_station_id",
+    "end_station_id",
+    "start_lat",
+    "start_lng",
+    "end_lat",
+    "end_lng",
+]
+
+# Colonne stazione a bassa cardinalità: arrivano come Categorical (codici int)
+STATION_COLUMNS = ["start_station_name", "start_station_id", "end_station_name", "end_station_id"]
+STATION_DICT_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+# Tipi espliciti per pyarrow: timestamp già parsati, niente passaggio da stringa
+ARROW_COLUMN_TYPES = {
+    "ride_id": pa.string(),
+    "rideable_type": pa.string(),
+    "started_at": pa.timestamp("ns"),
+    "ended_at": pa.timestamp("ns"),
+    "start_station_name": STATION_DICT_TYPE,
+    "start_station_id": STATION_DICT_TYPE,
+    "end_station_name": STATION_DICT_TYPE,
+    "end_station_id": STATION_DICT_TYPE,
+    "start_lat": pa.float64(),
+    "start_lng": pa.float64(),
+    "end_lat": pa.float64(),
+    "end_lng": pa.float64(),
+    "member_casual": pa.string(),
+}
+
+# Timestamp letti come NaN dal fallback pandas (oltre ai default di read_csv)
+DATETIME_NA_VALUES = ["", "NaT", "nan", "None"]
+
+# Contatori in RAM: nome -> (file di output, chiavi + conteggio)
+COUNT_OUTPUTS = {
+    "hourly": ("hourly_by_user.csv", ["hour", "member_casual", "trip_count"]),
+    "weekday": ("weekday_by_user.csv", ["weekday_index", "member_casual", "trip_count"]),
+    "rideable": ("rideable_type_share.csv", ["rideable_type", "trip_count"]),
+    "member": ("member_share.csv", ["member_casual", "trip_count"]),
+    "duration": ("duration_bins.csv", ["duration_bin", "member_casual", "trip_count"]),
+}
+
 DURATION_BINS = [0, 5, 10, 20, 40, 10_000]
 DURATION_LABELS = [
     "0-5 min",
@@ -40,119 +101,26 @@ DURATION_LABELS = [
     "20-40 min",
     "40+ min",
 ]
-
-
-# -----------------------
-# SQLite helpers
-# -----------------------
-def make_conn(db_path: Path) -> sqlite3.Connection:
-    conn = sqlite3.connect(db_path)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA synchronous=NORMAL;")
-    conn.execute("PRAGMA temp_store=MEMORY;")
-    conn.execute("PRAGMA cache_size=-20000;")  # ~20MB
-    return conn
-
-
-def init_db(conn: sqlite3.Connection) -> None:
-    conn.executescript(
-        """
-        CREATE TABLE IF NOT EXISTS flows (
-            start_station_id   TEXT NOT NULL,
-            end_station_id     TEXT NOT NULL,
-            start_station_name TEXT,
-            start_lat          REAL,
-            start_lng          REAL,
-            end_station_name   TEXT,
-            end_lat            REAL,
-            end_lng            REAL,
-            trip_count         INTEGER NOT NULL,
-            duration_sum       REAL NOT NULL,
-            PRIMARY KEY (start_station_id, end_station_id)
-        );
-
-        CREATE TABLE IF NOT EXISTS stations (
-            station_id   TEXT PRIMARY KEY,
-            station_name TEXT,
-            lat          REAL,
-            lng          REAL,
-            trip_count   INTEGER NOT NULL
-        );
-        """
-    )
-
-
-def upsert_flows(conn: sqlite3.Connection, df: pd.DataFrame) -> None:
-    rows = list(
-        df[
-            [
-                "start_station_id",
-                "end_station_id",
-                "start_station_name",
-                "start_lat",
-                "start_lng",
-                "end_station_name",
-                "end_lat",
-                "end_lng",
-                "trip_count",
-                "duration_sum",
-            ]
-        ].itertuples(index=False, name=None)
-    )
-    conn.executemany(
-        """
-        INSERT INTO flows (
-            start_station_id, end_station_id,
-            start_station_name, start_lat, start_lng,
-            end_station_name, end_lat, end_lng,
-            trip_count, duration_sum
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(start_station_id, end_station_id) DO UPDATE SET
-            trip_count   = flows.trip_count + excluded.trip_count,
-            duration_sum = flows.duration_sum + excluded.duration_sum,
-            start_station_name = COALESCE(flows.start_station_name, excluded.start_station_name),
-            start_lat = COALESCE(flows.start_lat, excluded.start_lat),
-            start_lng = COALESCE(flows.start_lng, excluded.start_lng),
-            end_station_name = COALESCE(flows.end_station_name, excluded.end_station_name),
-            end_lat = COALESCE(flows.end_lat, excluded.end_lat),
-            end_lng = COALESCE(flows.end_lng, excluded.end_lng)
-        """,
-        rows,
-    )
-
-
-def upsert_stations(conn: sqlite3.Connection, df: pd.DataFrame) -> None:
-    rows = list(
-        df[
-            ["start_station_id", "start_station_name", "start_lat", "start_lng", "trip_count"]
-        ].itertuples(index=False, name=None)
-    )
-    conn.executemany(
-        """
-        INSERT INTO stations (station_id, station_name, lat, lng, trip_count)
-        VALUES (?, ?, ?, ?, ?)
-        ON CONFLICT(station_id) DO UPDATE SET
-            trip_count = stations.trip_count + excluded.trip_count,
-            station_name = COALESCE(stations.station_name, excluded.station_name),
-            lat = COALESCE(stations.lat, excluded.lat),
-            lng = COALESCE(stations.lng, excluded.lng)
-        """,
-        rows,
-    )
+# Bordi interni di DURATION_BINS (primo/ultimo coperti dal filtro 0..360 min)
+DURATION_EDGES = np.array(DURATION_BINS[1:-1], dtype=np.float64)
 
 
 # -----------------------
 # In-RAM counters
 # -----------------------
-def add_counts(counter: dict[tuple, int], group_df: pd.DataFrame) -> None:
-    for row in group_df.itertuples(index=False, name=None):
-        counter[row[:-1]] += int(row[-1])
-
-
-def counter_to_df(counter: dict[tuple, int], columns: list[str]) -> pd.DataFrame:
-    rows = [list(k) + [v] for k, v in counter.items()]
-    return pd.DataFrame(rows, columns=columns)
+def sum_counts(parts: list[pd.DataFrame], columns: list[str]) -> pd.DataFrame:
+    """
+    Riduce i conteggi parziali (uno per chunk) con un solo groupby-sum finale.
+    """
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    keys = columns[:-1]
+    # un solo parziale: niente concat (copierebbe il frame per intero)
+    combined = parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+    return (
+        combined.groupby(keys, observed=True, sort=True, as_index=False)[columns[-1]]
+        .sum()
+    )
 
 
 # -----------------------
@@ -163,62 +131,293 @@ def parse_datetime_utc(series: pd.Series) -> pd.Series:
     Converte una Series (stringhe sporche/mix formati) in datetime UTC.
     Ritorna datetime64[ns, UTC] (o NaT).
     """
-    s = series.astype("string").str.strip()
-    s = s.replace({"": pd.NA, "NaT": pd.NA, "nan": pd.NA, "None": pd.NA})
+    # Vuoti/"NaT"/"nan"/"None" arrivano già come NaN (na_values in read_csv), quindi
+    # niente strip/replace su tutta la colonna: spazi o formati strani finiscono
+    # nel secondo passaggio "mixed".
 
-    # Pandas >= 2.0 supporta format="mixed". Se non disponibile, fallback.
+    # Pandas >= 2.0: prima il parser ISO8601 in C (copre "%Y-%m-%d %H:%M:%S" con
+    # o senza frazioni), poi format="mixed" solo sulle righe rimaste NaT.
     try:
-        dt = pd.to_datetime(s, errors="coerce", utc=True, format="mixed", cache=True)
+        dt = pd.to_datetime(series, errors="coerce", utc=True, format="ISO8601", cache=True)
     except TypeError:
-        dt = pd.to_datetime(s, errors="coerce", utc=True, cache=True)
+        return pd.to_datetime(series, errors="coerce", utc=True, cache=True)
+
+    retry = dt.isna() & series.notna()
+    if retry.any():
+        dt[retry] = pd.to_datetime(
+            series[retry], errors="coerce", utc=True, format="mixed", cache=True
+        )
 
     return dt
 
 
-def duration_minutes(start_dt: pd.Series, end_dt: pd.Series) -> pd.Series:
+def iter_chunks(file: Path) -> Iterator[pd.DataFrame]:
     """
-    Durata in minuti via differenza numerica in ns.
-    Evita completamente `.dt` sul risultato della sottrazione.
+    Legge il CSV a blocchi con pyarrow (colonne tipizzate, started_at/ended_at UTC).
+    Se un blocco non si converte (formati sporchi), le righe restanti passano
+    dal vecchio percorso pandas + parse_datetime_utc.
     """
-    # start_dt/end_dt sono già tz-aware UTC, ma li normalizziamo comunque
-    start = pd.to_datetime(start_dt, utc=True, errors="coerce")
-    end = pd.to_datetime(end_dt, utc=True, errors="coerce")
-
-    # Converti a naive UTC (datetime64[ns]) per fare differenze stabili
-    start_naive = start.dt.tz_convert("UTC").dt.tz_localize(None)
-    end_naive = end.dt.tz_convert("UTC").dt.tz_localize(None)
-
-    start_ns = start_naive.values.astype("datetime64[ns]").astype("int64")
-    end_ns = end_naive.values.astype("datetime64[ns]").astype("int64")
+    rows_read = 0
+    try:
+        reader = pacsv.open_csv(
+            file,
+            read_options=pacsv.ReadOptions(block_size=ARROW_BLOCK_BYTES),
+            convert_options=pacsv.ConvertOptions(
+                include_columns=USECOLS,
+                column_types=ARROW_COLUMN_TYPES,
+                strings_can_be_null=True,
+            ),
+        )
+        for batch in reader:
+            chunk = batch.to_pandas()
+            chunk["started_at"] = chunk["started_at"].dt.tz_localize("UTC")
+            chunk["ended_at"] = chunk["ended_at"].dt.tz_localize("UTC")
+            rows_read += batch.num_rows
+            yield chunk
+        return
+    except pa.ArrowInvalid as exc:
+        print(f"[WARN] {file.name}: pyarrow fallback to pandas after {rows_read:,} rows ({exc})")
+
+    # I record già letti da pyarrow si scartano contando i record restituiti, non con
+    # skiprows (le sue "righe" non sono garantite come record se un campo quotato
+    # contiene un a capo): così il punto di ripresa non può spostarsi.
+    to_skip = rows_read
+    for chunk in pd.read_csv(
+        file,
+        usecols=USECOLS,
+        chunksize=CHUNK_SIZE,
+        low_memory=False,
+        dtype={"start_station_id": "string", "end_station_id": "string"},
+        na_values={"started_at": DATETIME_NA_VALUES, "ended_at": DATETIME_NA_VALUES},
+    ):
+        if to_skip:
+            skipped = min(to_skip, len(chunk))
+            to_skip -= skipped
+            chunk = chunk.iloc[skipped:]
+            if chunk.empty:
+                continue
+        chunk["started_at"] = parse_datetime_utc(chunk["started_at"])
+        chunk["ended_at"] = parse_datetime_utc(chunk["ended_at"])
+        for column in STATION_COLUMNS:
+            chunk[column] = chunk[column].astype("category")
+        yield chunk
+
+
+def duration_minutes(start_dt: pd.Series, end_dt: pd.Series) -> np.ndarray:
+    """
+    Durata in minuti via differenza numerica in ns, direttamente sui buffer int64.
+    NaN dove manca uno dei due timestamp.
+    """
+    # tz-aware UTC -> datetime64[ns] naive UTC, senza passare da `.dt`
+    start_ns = start_dt.to_numpy(dtype="datetime64[ns]").view("int64")
+    end_ns = end_dt.to_numpy(dtype="datetime64[ns]").view("int64")
 
-    nat = pd.Timestamp("NaT").value
+    nat = np.iinfo(np.int64).min
     valid = (start_ns != nat) & (end_ns != nat)
 
-    out = pd.Series(pd.NA, index=start_dt.index, dtype="Float64")
-    out.loc[valid] = (end_ns[valid] - start_ns[valid]) / 60_000_000_000.0
+    out = np.full(len(start_ns), np.nan)
+    out[valid] = (end_ns[valid] - start_ns[valid]) / 60_000_000_000.0
     return out
 
 
+def merge_groups(parts: list[pd.DataFrame], keys: list[str], sum_columns: list[str]) -> pd.DataFrame:
+    """
+    Unisce gli aggregati dei chunk di un file: somma i conteggi, "first" per il resto.
+    """
+    combined = parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+    agg = {col: ("sum" if col in sum_columns else "first") for col in combined.columns if col not in keys}
+    return combined.groupby(keys, sort=False, observed=True, as_index=False).agg(agg)
+
+
+def append_merged(
+    parts: list[pd.DataFrame], part: pd.DataFrame, keys: list[str], sum_columns: list[str]
+) -> None:
+    """
+    Accoda l'aggregato di un file; ogni COMPACT_FILES file la lista viene
+    ridotta a un solo frame (le chiavi stazione sono limitate, la RAM resta piatta).
+    """
+    parts.append(part)
+    if len(parts) >= COMPACT_FILES:
+        parts[:] = [merge_groups(parts, keys, sum_columns)]
+
+
+def process_file(file: Path) -> tuple[int, pd.DataFrame | None, pd.DataFrame | None, dict[str, pd.DataFrame]]:
+    """
+    Aggrega un CSV mensile (gira in un processo worker).
+    Ritorna righe tenute, flows/stations del file e i contatori del file.
+    """
+    rows_kept = 0
+    flow_parts: list[pd.DataFrame] = []
+    station_parts: list[pd.DataFrame] = []
+    count_parts: dict[str, list[pd.DataFrame]] = {name: [] for name in COUNT_OUTPUTS}
+
+    for chunk in iter_chunks(file):
+        # Un'unica maschera (campi obbligatori + durate realistiche 0..360 min)
+        # e un solo take, invece di dropna/filtri/copy ripetuti.
+        duration = duration_minutes(chunk["started_at"], chunk["ended_at"])
+        # NaN < / > qualsiasi cosa è False: le durate mancanti cadono da sole
+        keep = (duration >= 0) & (duration <= 360)
+        # notna colonna per colonna: niente sotto-DataFrame copiato per i campi obbligatori
+        for column in REQUIRED_COLUMNS:
+            keep &= chunk[column].notna().to_numpy()
+        rows = np.flatnonzero(keep)
+        if len(rows) == 0:
+            continue
+
+        chunk = chunk.take(rows)
+        chunk["duration_min"] = duration[rows]
+
+        rows_kept += len(chunk)
+
+        # ---- FLOWS & STATIONS ----
+        flow_parts.append(
+            chunk.groupby(["start_station_id", "end_station_id"], dropna=True, observed=True)
+            .agg(
+                start_station_name=("start_station_name", "first"),
+                start_lat=("start_lat", "first"),
+                start_lng=("start_lng", "first"),
+                end_station_name=("end_station_name", "first"),
+                end_lat=("end_lat", "first"),
+                end_lng=("end_lng", "first"),
+                trip_count=("ride_id", "count"),
+                duration_sum=("duration_min", "sum"),
+            )
+            .reset_index()
+        )
+
+        station_parts.append(
+            chunk.groupby(["start_station_id"], dropna=True, observed=True)
+            .agg(
+                start_station_name=("start_station_name", "first"),
+                start_lat=("start_lat", "first"),
+                start_lng=("start_lng", "first"),
+                trip_count=("ride_id", "count"),
+            )
+            .reset_index()
+        )
+
+        # ---- COUNTERS (RAM) ----
+        # Sicuro: started_at è datetime tz-aware
+        # chunk è già una copia (take): nuove colonne assegnate in place, senza
+        # .loc né assign (che copierebbe di nuovo l'intero frame)
+        chunk["hour"] = chunk["started_at"].dt.hour
+        chunk["weekday_index"] = chunk["started_at"].dt.dayofweek
+
+        # Un solo groupby sul chunk per hourly/weekday/rideable/member:
+        # ognuno è una proiezione di questa tabella (piccola), sommata in sum_counts.
+        chunk_counts = (
+            chunk.groupby(
+                ["hour", "weekday_index", "rideable_type", "member_casual"], dropna=False
+            )
+            .agg(trip_count=("ride_id", "count"))
+            .reset_index()
+        )
+        for name in ("hourly", "weekday", "rideable", "member"):
+            count_parts[name].append(chunk_counts[COUNT_OUTPUTS[name][1]])
+
+        # Bordi fissi: searchsorted sui bordi interni al posto di pd.cut (niente
+        # IntervalIndex). side="left" = intervalli chiusi a destra come pd.cut;
+        # le durate sono già in 0..360, quindi nessun valore fuori dai bin.
+        duration_bins = pd.Categorical.from_codes(
+            np.searchsorted(DURATION_EDGES, chunk["duration_min"].to_numpy(), side="left"),
+            categories=DURATION_LABELS,
+            ordered=True,
+        )
+        count_parts["duration"].append(
+            chunk.assign(duration_bin=duration_bins)
+            .groupby(["duration_bin", "member_casual"], observed=False)
+            .agg(trip_count=("ride_id", "count"))
+            .reset_index()
+        )
+
+    if not flow_parts:
+        return rows_kept, None, None, {}
+
+    flows = merge_groups(
+        flow_parts, ["start_station_id", "end_station_id"], ["trip_count", "duration_sum"]
+    )
+    stations = merge_groups(station_parts, ["start_station_id"], ["trip_count"])
+    counts = {
+        name: sum_counts(parts, COUNT_OUTPUTS[name][1]) for name, parts in count_parts.items()
+    }
+    return rows_kept, flows, stations, counts
+
+
+def top_flows(parts: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Le TOP_FLOWS coppie con più viaggi (a parità: id di partenza e arrivo).
+    """
+    columns = [
+        "start_station_id",
+        "start_station_name",
+        "start_lat",
+        "start_lng",
+        "end_station_id",
+        "end_station_name",
+        "end_lat",
+        "end_lng",
+        "trip_count",
+        "avg_duration_min",
+    ]
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    flows = merge_groups(parts, FLOW_KEYS, ["trip_count", "duration_sum"])
+    for key in FLOW_KEYS:
+        flows[key] = flows[key].astype(object)
+    flows = flows.sort_values(
+        ["trip_count", *FLOW_KEYS], ascending=[False, True, True], kind="stable"
+    ).head(TOP_FLOWS)
+
+    # Arrotondamento "half away from zero" come ROUND(x, 2) di SQLite
+    avg = np.where(flows["trip_count"] > 0, flows["duration_sum"] / flows["trip_count"], 0.0)
+    flows["avg_duration_min"] = np.floor(avg * 100 + 0.5) / 100
+    return flows[columns].reset_index(drop=True)
+
+
+def top_stations(parts: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Le TOP_STATIONS stazioni di partenza con più viaggi (a parità: id).
+    """
+    columns = ["station_id", "station_name", "lat", "lng", "trip_count"]
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    stations = merge_groups(parts, STATION_KEYS, ["trip_count"])
+    stations["start_station_id"] = stations["start_station_id"].astype(object)
+    stations = stations.sort_values(
+        ["trip_count", "start_station_id"], ascending=[False, True], kind="stable"
+    ).head(TOP_STATIONS)
+    stations = stations.rename(
+        columns={
+            "start_station_id": "station_id",
+            "start_station_name": "station_name",
+            "start_lat": "lat",
+            "start_lng": "lng",
+        }
+    )
+    return stations[columns].reset_index(drop=True)
+
+
+def file_year(file: Path) -> int | None:
+    """
+    Anno dal nome file (es. 202301-citibike-tripdata.csv -> 2023), senza aprirlo.
+    """
+    match = YEAR_RE.search(file.name)
+    return int(match.group(1)) if match else None
+
+
 def main() -> None:
     files = sorted(INPUT_DIR.glob("*.csv"))
+    if YEARS:
+        # I file fuori dagli anni richiesti non vengono nemmeno aperti
+        files = [f for f in files if file_year(f) in YEARS or file_year(f) is None]
     if not files:
         raise SystemExit("No CSV files found in data/tripdata.")
 
     OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-    # DB temporaneo di aggregazione
-    db_path = OUT_DIR / "_agg.sqlite"
-    if db_path.exists():
-        db_path.unlink()
-
-    conn = make_conn(db_path)
-    init_db(conn)
-
-    hourly_counter: dict[tuple, int] = defaultdict(int)
-    weekday_counter: dict[tuple, int] = defaultdict(int)
-    rideable_counter: dict[tuple, int] = defaultdict(int)
-    member_counter: dict[tuple, int] = defaultdict(int)
-    duration_counter: dict[tuple, int] = defaultdict(int)
+    flow_parts: list[pd.DataFrame] = []
+    station_parts: list[pd.DataFrame] = []
+    count_parts: dict[str, list[pd.DataFrame]] = {name: [] for name in COUNT_OUTPUTS}
 
     total_bytes = sum(f.stat().st_size for f in files)
     pbar = tqdm(
@@ -234,198 +433,38 @@ def main() -> None:
     rows_kept = 0
 
     try:
-        for file in files:
-            file_size = file.stat().st_size
-            pbar.set_postfix_str(file.name)
-
-            # Leggiamo normalmente: progress bar aggiornata UNA VOLTA a fine file (robusto)
-            for chunk in pd.read_csv(
-                file,
-                usecols=USECOLS,
-                chunksize=CHUNK_SIZE,
-                low_memory=False,
-                dtype={"start_station_id": "string", "end_station_id": "string"},
+        # I file sono indipendenti: un processo per file, riduzione qui nell'ordine dei file
+        # (così "first" tiene ancora il primo nome/coordinate non nullo visto).
+        with ProcessPoolExecutor(max_workers=WORKERS) as executor:
+            for file, (kept, flows, stations, counts) in zip(
+                files, executor.map(process_file, files)
             ):
-                # Filtri base + copy per evitare SettingWithCopyWarning
-                chunk = chunk.dropna(
-                    subset=[
-                        "started_at",
-                        "ended_at",
-                        "start_station_id",
-                        "end_station_id",
-                        "start_lat",
-                        "start_lng",
-                        "end_lat",
-                        "end_lng",
-                    ]
-                ).copy()
-
-                if chunk.empty:
-                    continue
-
-                start_dt = parse_datetime_utc(chunk["started_at"])
-                end_dt = parse_datetime_utc(chunk["ended_at"])
-                chunk = chunk.assign(started_at=start_dt, ended_at=end_dt)
-
-                chunk.loc[:, "duration_min"] = duration_minutes(start_dt, end_dt)
-                chunk = chunk.dropna(subset=["duration_min"]).copy()
-                if chunk.empty:
-                    continue
-
-                # Durate realistiche (0..360 min)
-                chunk = chunk[(chunk["duration_min"] >= 0) & (chunk["duration_min"] <= 360)].copy()
-                if chunk.empty:
-                    continue
-
-                rows_kept += len(chunk)
+                rows_kept += kept
                 pbar.set_postfix_str(f"{file.name} | kept={rows_kept:,}")
 
-                # ---- FLOWS & STATIONS (DB) ----
-                flow_group = (
-                    chunk.groupby(["start_station_id", "end_station_id"], dropna=True)
-                    .agg(
-                        start_station_name=("start_station_name", "first"),
-                        start_lat=("start_lat", "first"),
-                        start_lng=("start_lng", "first"),
-                        end_station_name=("end_station_name", "first"),
-                        end_lat=("end_lat", "first"),
-                        end_lng=("end_lng", "first"),
-                        trip_count=("ride_id", "count"),
-                        duration_sum=("duration_min", "sum"),
-                    )
-                    .reset_index()
-                )
-
-                station_group = (
-                    chunk.groupby(["start_station_id"], dropna=True)
-                    .agg(
-                        start_station_name=("start_station_name", "first"),
-                        start_lat=("start_lat", "first"),
-                        start_lng=("start_lng", "first"),
-                        trip_count=("ride_id", "count"),
-                    )
-                    .reset_index()
-                )
-
-                conn.execute("BEGIN;")
-                try:
-                    upsert_flows(conn, flow_group)
-                    upsert_stations(conn, station_group)
-                    conn.execute("COMMIT;")
-                except Exception:
-                    conn.execute("ROLLBACK;")
-                    raise
-
-                # ---- COUNTERS (RAM) ----
-                # Sicuro: started_at è datetime tz-aware
-                chunk.loc[:, "hour"] = chunk["started_at"].dt.hour
-                chunk.loc[:, "weekday_index"] = chunk["started_at"].dt.dayofweek
-
-                hourly_group = (
-                    chunk.groupby(["hour", "member_casual"])
-                    .agg(trip_count=("ride_id", "count"))
-                    .reset_index()
-                )
-                add_counts(hourly_counter, hourly_group)
-
-                weekday_group = (
-                    chunk.groupby(["weekday_index", "member_casual"])
-                    .agg(trip_count=("ride_id", "count"))
-                    .reset_index()
-                )
-                add_counts(weekday_counter, weekday_group)
-
-                rideable_group = (
-                    chunk.groupby(["rideable_type"])
-                    .agg(trip_count=("ride_id", "count"))
-                    .reset_index()
-                )
-                add_counts(rideable_counter, rideable_group)
-
-                member_group = (
-                    chunk.groupby(["member_casual"])
-                    .agg(trip_count=("ride_id", "count"))
-                    .reset_index()
-                )
-                add_counts(member_counter, member_group)
-
-                duration_bins = pd.cut(
-                    chunk["duration_min"].astype("float64"),
-                    bins=DURATION_BINS,
-                    labels=DURATION_LABELS,
-                    include_lowest=True,
-                )
-                duration_group = (
-                    chunk.assign(duration_bin=duration_bins)
-                    .groupby(["duration_bin", "member_casual"], observed=False)
-                    .agg(trip_count=("ride_id", "count"))
-                    .reset_index()
-                )
-                add_counts(duration_counter, duration_group)
-
-            # ✅ avanzamento “robusto”: a fine file aggiungiamo la sua dimensione
-            pbar.update(file_size)
+                if flows is not None:
+                    append_merged(flow_parts, flows, FLOW_KEYS, ["trip_count", "duration_sum"])
+                    append_merged(station_parts, stations, STATION_KEYS, ["trip_count"])
+
+                for name, frame in counts.items():
+                    count_parts[name].append(frame)
+
+                # ✅ avanzamento “robusto”: a fine file aggiungiamo la sua dimensione
+                pbar.update(file.stat().st_size)
 
     finally:
         pbar.close()
 
     # ---- EXPORT FINALI ----
-    flows_df = pd.read_sql_query(
-        """
-        SELECT
-            start_station_id,
-            start_station_name,
-            start_lat,
-            start_lng,
-            end_station_id,
-            end_station_name,
-            end_lat,
-            end_lng,
-            trip_count,
-            ROUND(CASE WHEN trip_count > 0 THEN duration_sum * 1.0 / trip_count ELSE 0 END, 2) AS avg_duration_min
-        FROM flows
-        ORDER BY trip_count DESC
-        LIMIT ?
-        """,
-        conn,
-        params=(TOP_FLOWS,),
-    )
+    flows_df = top_flows(flow_parts)
     flows_df.to_csv(OUT_DIR / "top_flows.csv", index=False)
 
-    stations_df = pd.read_sql_query(
-        """
-        SELECT
-            station_id   AS station_id,
-            station_name AS station_name,
-            lat          AS lat,
-            lng          AS lng,
-            trip_count   AS trip_count
-        FROM stations
-        ORDER BY trip_count DESC
-        LIMIT ?
-        """,
-        conn,
-        params=(TOP_STATIONS,),
-    )
+    stations_df = top_stations(station_parts)
     stations_df.to_csv(OUT_DIR / "top_start_stations.csv", index=False)
 
-    counter_to_df(hourly_counter, ["hour", "member_casual", "trip_count"]).to_csv(
-        OUT_DIR / "hourly_by_user.csv", index=False
-    )
-    counter_to_df(weekday_counter, ["weekday_index", "member_casual", "trip_count"]).to_csv(
-        OUT_DIR / "weekday_by_user.csv", index=False
-    )
-    counter_to_df(rideable_counter, ["rideable_type", "trip_count"]).to_csv(
-        OUT_DIR / "rideable_type_share.csv", index=False
-    )
-    counter_to_df(member_counter, ["member_casual", "trip_count"]).to_csv(
-        OUT_DIR / "member_share.csv", index=False
-    )
-    counter_to_df(duration_counter, ["duration_bin", "member_casual", "trip_count"]).to_csv(
-        OUT_DIR / "duration_bins.csv", index=False
-    )
+    for name, (filename, columns) in COUNT_OUTPUTS.items():
+        sum_counts(count_parts[name], columns).to_csv(OUT_DIR / filename, index=False)
 
-    conn.close()
     WEB_OUT_DIR.mkdir(parents=True, exist_ok=True)
     for csv_path in OUT_DIR.glob("*.csv"):
         shutil.copy2(csv_path, WEB_OUT_DIR / csv_path.name)
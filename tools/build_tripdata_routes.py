@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import csv
+import heapq
 import json
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Iterator
 
 try:
     from tqdm import tqdm
@@ -12,10 +14,17 @@ except ImportError:  # pragma: no cover
         return iterable if iterable is not None else []
 
 import networkx as nx
+import numpy as np
 import osmnx as ox
-from pyproj import Transformer
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import shapely
+from scipy.sparse.csgraph import dijkstra
 from shapely.geometry import LineString
-from shapely.ops import transform as geom_transform
+
+from geojson_io import write_geojson
+from isochrone_graph import add_edge_lengths_safe, cached_graph, length_csr
 
 
 INPUT_CSV = Path("data/processed/tripdata/top_flows.csv")
@@ -27,11 +36,19 @@ TARGET_ROUTES = 10
 CANDIDATE_LIMIT = 30
 PAD_DEGREES = 0.02
 
+# top_routes.csv columns, in the order of the row tuples built in main
+CSV_FIELDS = [
+    "route_id",
+    "start_station_name",
+    "end_station_name",
+    "trip_count",
+    "distance_m",
+    "coords",
+]
 
-def add_edge_lengths_safe(graph: nx.MultiDiGraph) -> nx.MultiDiGraph:
-    if hasattr(ox, "add_edge_lengths"):
-        return ox.add_edge_lengths(graph)
-    return ox.distance.add_edge_lengths(graph)
+# top_flows.csv columns read by load_candidates
+NUMERIC_COLUMNS = ["start_lng", "start_lat", "end_lng", "end_lat", "trip_count"]
+TEXT_COLUMNS = ["start_station_id", "start_station_name", "end_station_id", "end_station_name"]
 
 
 @dataclass
@@ -47,11 +64,8 @@ class RouteCandidate:
     trip_count: int
 
 
-def load_candidates(path: Path) -> list[RouteCandidate]:
-    if not path.exists():
-        raise SystemExit(f"Missing input CSV: {path}")
-
-    candidates: list[RouteCandidate] = []
+def iter_candidate_rows(path: Path) -> Iterator[RouteCandidate]:
+    """Row-by-row parse that skips malformed rows (fallback for files pyarrow rejects)."""
     with path.open(newline="") as handle:
         reader = csv.DictReader(handle)
         for row in reader:
@@ -67,21 +81,67 @@ def load_candidates(path: Path) -> list[RouteCandidate]:
             if row.get("start_station_id") == row.get("end_station_id"):
                 continue
 
-            candidates.append(
-                RouteCandidate(
-                    start_station_id=row.get("start_station_id", ""),
-                    start_station_name=row.get("start_station_name", ""),
-                    start_lat=start_lat,
-                    start_lng=start_lng,
-                    end_station_id=row.get("end_station_id", ""),
-                    end_station_name=row.get("end_station_name", ""),
-                    end_lat=end_lat,
-                    end_lng=end_lng,
-                    trip_count=trip_count,
-                )
+            yield RouteCandidate(
+                start_station_id=row.get("start_station_id", ""),
+                start_station_name=row.get("start_station_name", ""),
+                start_lat=start_lat,
+                start_lng=start_lng,
+                end_station_id=row.get("end_station_id", ""),
+                end_station_name=row.get("end_station_name", ""),
+                end_lat=end_lat,
+                end_lng=end_lng,
+                trip_count=trip_count,
             )
 
-    return sorted(candidates, key=lambda d: d.trip_count, reverse=True)
+
+def load_candidates(path: Path) -> list[RouteCandidate]:
+    """Top CANDIDATE_LIMIT flows by trip_count; only those rows become dataclasses."""
+    if not path.exists():
+        raise SystemExit(f"Missing input CSV: {path}")
+
+    try:
+        table = pacsv.read_csv(
+            path,
+            convert_options=pacsv.ConvertOptions(
+                include_columns=NUMERIC_COLUMNS + TEXT_COLUMNS,
+                include_missing_columns=True,
+                column_types={
+                    **{column: pa.float64() for column in NUMERIC_COLUMNS},
+                    **{column: pa.string() for column in TEXT_COLUMNS},
+                },
+            ),
+        )
+    except pa.ArrowInvalid as exc:
+        print(f"[WARN] {path.name}: pyarrow fallback to row-by-row parsing ({exc})")
+        # Bounded heap: same result as sorted(reverse=True)[:k], ties in file order.
+        return heapq.nlargest(
+            CANDIDATE_LIMIT, iter_candidate_rows(path), key=lambda d: d.trip_count
+        )
+
+    # Empty numbers (and missing columns) come back null; those rows are skipped.
+    keep = pc.not_equal(
+        pc.fill_null(table["start_station_id"], ""), pc.fill_null(table["end_station_id"], "")
+    )
+    for column in NUMERIC_COLUMNS:
+        keep = pc.and_(keep, pc.is_valid(table[column]))
+    table = table.filter(keep)
+    # Stable sort: ties keep file order, as sorted() did.
+    table = table.sort_by([("trip_count", "descending")]).slice(0, CANDIDATE_LIMIT)
+
+    return [
+        RouteCandidate(
+            start_station_id=row["start_station_id"] or "",
+            start_station_name=row["start_station_name"] or "",
+            start_lat=row["start_lat"],
+            start_lng=row["start_lng"],
+            end_station_id=row["end_station_id"] or "",
+            end_station_name=row["end_station_name"] or "",
+            end_lat=row["end_lat"],
+            end_lng=row["end_lng"],
+            trip_count=int(row["trip_count"]),
+        )
+        for row in table.to_pylist()
+    ]
 
 
 def compute_bbox(candidates: list[RouteCandidate]) -> tuple[float, float, float, float]:
@@ -139,80 +199,120 @@ def build_graph(west: float, south: float, east: float, north: float) -> nx.Mult
     return add_edge_lengths_safe(graph)
 
 
-def route_to_linestring(graph: nx.MultiDiGraph, route: list[int]) -> LineString | None:
-    coords: list[tuple[float, float]] = []
+def route_to_linestring(
+    graph: nx.MultiDiGraph, node_ids: np.ndarray, node_xy: np.ndarray, path: np.ndarray
+) -> LineString | None:
+    """Line along a route given as node positions (indices into node_ids / node_xy)."""
+    route = node_ids[path].tolist()
+    # Node coordinates for the whole route in one fancy-index, not per-edge dict lookups.
+    route_xy = node_xy[path]
+    segments: list[np.ndarray] = []
 
-    for u, v in zip(route[:-1], route[1:]):
+    for i, (u, v) in enumerate(zip(route[:-1], route[1:])):
         data = graph.get_edge_data(u, v) or {}
         if not data:
             continue
         edge = min(data.values(), key=lambda d: d.get("length", 0))
         geometry = edge.get("geometry")
         if geometry is None:
-            coords.append((graph.nodes[u]["x"], graph.nodes[u]["y"]))
-            coords.append((graph.nodes[v]["x"], graph.nodes[v]["y"]))
+            segments.append(route_xy[i : i + 2])
         else:
-            coords.extend(list(geometry.coords))
+            segments.append(shapely.get_coordinates(geometry))
 
-    cleaned: list[tuple[float, float]] = []
-    for point in coords:
-        if not cleaned or point != cleaned[-1]:
-            cleaned.append(point)
+    if not segments:
+        return None
+
+    # One array for the whole route; consecutive repeats (shared segment ends) dropped.
+    coords = np.concatenate(segments)
+    keep = np.ones(len(coords), dtype=bool)
+    keep[1:] = np.any(coords[1:] != coords[:-1], axis=1)
+    coords = coords[keep]
 
-    if len(cleaned) < 2:
+    if len(coords) < 2:
         return None
 
-    return LineString(cleaned)
+    return LineString(coords)
+
+
+def route_path(predecessors: np.ndarray, source: int, target: int) -> np.ndarray | None:
+    """Node positions from source to target along a predecessor row (None if unreachable)."""
+    if target != source and predecessors[target] < 0:
+        return None
+    path = [target]
+    while path[-1] != source:
+        path.append(predecessors[path[-1]])
+    return np.array(path[::-1], dtype=np.intp)
 
 
 def main() -> None:
-    steps = tqdm(total=3, desc="Preparing routing", unit="step")
+    steps = tqdm(total=2, desc="Preparing routing", unit="step")
     candidates = load_candidates(INPUT_CSV)
     if not candidates:
         raise SystemExit("No valid candidates found in top_flows.csv")
     steps.update(1)
 
-    candidates = candidates[:CANDIDATE_LIMIT]
     west, south, east, north = compute_bbox(candidates)
 
     print("Building bike network graph...")
-    graph = build_graph(west, south, east, north)
-    steps.update(1)
-    graph_proj = ox.project_graph(graph)
+    # The bbox only moves when the top flows do: warm runs skip the download.
+    graph = cached_graph(
+        f"bike_{west:.3f}_{south:.3f}_{east:.3f}_{north:.3f}",
+        lambda: build_graph(west, south, east, north),
+    )
     steps.update(1)
     steps.close()
 
-    transformer_to_proj = Transformer.from_crs("EPSG:4326", graph_proj.graph["crs"], always_xy=True)
-    transformer_to_wgs = Transformer.from_crs(graph_proj.graph["crs"], "EPSG:4326", always_xy=True)
+    # Routing runs on a CSR length matrix in SciPy's C Dijkstra; one shortest-path
+    # tree per distinct start node serves every candidate leaving from it. The graph
+    # stays in lng/lat: edge lengths are already meters, so nothing is projected.
+    node_ids, lengths = length_csr(graph)
+    node_index = {node: i for i, node in enumerate(node_ids.tolist())}
+    node_xy = np.array([(data["x"], data["y"]) for _, data in graph.nodes(data=True)])
+    # Every candidate's endpoints snapped in one batched query per side; on an
+    # unprojected graph osmnx uses a haversine BallTree (scikit-learn).
+    start_nodes = ox.distance.nearest_nodes(
+        graph, [c.start_lng for c in candidates], [c.start_lat for c in candidates]
+    ).tolist()
+    end_nodes = ox.distance.nearest_nodes(
+        graph, [c.end_lng for c in candidates], [c.end_lat for c in candidates]
+    ).tolist()
+    trees: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+    # Stations that snap to the same node pair share one assembled line.
+    lines: dict[tuple[int, int], LineString | None] = {}
 
     features: list[dict] = []
-    csv_rows: list[dict] = []
+    csv_rows: list[tuple] = []
 
     for index, candidate in enumerate(tqdm(candidates, desc="Routing top trips")):
         if len(features) >= TARGET_ROUTES:
             break
 
-        start_x, start_y = transformer_to_proj.transform(candidate.start_lng, candidate.start_lat)
-        end_x, end_y = transformer_to_proj.transform(candidate.end_lng, candidate.end_lat)
-
-        try:
-            start_node = ox.distance.nearest_nodes(graph_proj, start_x, start_y)
-            end_node = ox.distance.nearest_nodes(graph_proj, end_x, end_y)
-            route = nx.shortest_path(graph_proj, start_node, end_node, weight="length")
-        except Exception as exc:
-            print(f"[WARN] Skip route {candidate.start_station_name} -> {candidate.end_station_name}: {exc}")
-            continue
+        source = node_index[start_nodes[index]]
+        target = node_index[end_nodes[index]]
+        if source not in trees:
+            trees[source] = dijkstra(
+                lengths, directed=True, indices=source, return_predecessors=True
+            )
+        distances, predecessors = trees[source]
+        if (source, target) not in lines:
+            path = route_path(predecessors, source, target)
+            if path is None:
+                print(f"[WARN] Skip route {candidate.start_station_name} -> {candidate.end_station_name}: no path")
+                continue
+            lines[source, target] = route_to_linestring(graph, node_ids, node_xy, path)
 
-        line_proj = route_to_linestring(graph_proj, route)
-        if not line_proj:
+        line_wgs = lines[source, target]
+        if not line_wgs:
             print(f"[WARN] Empty route {candidate.start_station_name} -> {candidate.end_station_name}")
             continue
 
-        line_wgs = geom_transform(transformer_to_wgs.transform, line_proj)
+        # Sum of the route's edge lengths (meters), straight from the Dijkstra tree.
+        distance_m = float(distances[target])
+        coords = shapely.get_coordinates(line_wgs)
 
         feature = {
             "type": "Feature",
-            "geometry": line_wgs.__geo_interface__,
+            "geometry": {"type": "LineString", "coordinates": coords},
             "properties": {
                 "route_id": f"route_{index + 1}",
                 "start_station_id": candidate.start_station_id,
@@ -220,39 +320,31 @@ def main() -> None:
                 "end_station_id": candidate.end_station_id,
                 "end_station_name": candidate.end_station_name,
                 "trip_count": candidate.trip_count,
-                "distance_m": float(line_proj.length),
+                "distance_m": distance_m,
             },
         }
         features.append(feature)
 
         csv_rows.append(
-            {
-                "route_id": feature["properties"]["route_id"],
-                "start_station_name": candidate.start_station_name,
-                "end_station_name": candidate.end_station_name,
-                "trip_count": candidate.trip_count,
-                "distance_m": f"{line_proj.length:.1f}",
-                "coords": json.dumps(list(line_wgs.coords)),
-            }
+            (
+                feature["properties"]["route_id"],
+                candidate.start_station_name,
+                candidate.end_station_name,
+                candidate.trip_count,
+                f"{distance_m:.1f}",
+                json.dumps(coords.tolist()),
+            )
         )
 
     if not features:
         raise SystemExit("No routes could be built from the candidate list.")
 
     OUT_DIR.mkdir(parents=True, exist_ok=True)
-    OUT_GEOJSON.write_text(json.dumps({"type": "FeatureCollection", "features": features}, indent=2))
+    write_geojson(OUT_GEOJSON, {"type": "FeatureCollection", "features": features})
 
     with OUT_CSV.open("w", newline="") as handle:
-        fieldnames = [
-            "route_id",
-            "start_station_name",
-            "end_station_name",
-            "trip_count",
-            "distance_m",
-            "coords",
-        ]
-        writer = csv.DictWriter(handle, fieldnames=fieldnames)
-        writer.writeheader()
+        writer = csv.writer(handle)
+        writer.writerow(CSV_FIELDS)
         writer.writerows(csv_rows)
 
     print(f"Saved {len(features)} routes to {OUT_GEOJSON}")
@@ -7,9 +7,12 @@ import subprocess
 import sys
 from collections import defaultdict
 from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from typing import Iterable
 
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
@@ -28,6 +31,8 @@ ZONE_LOOKUP = Path("data/yellow_taxi/Dataset/02.taxi_zones/taxi+_zone_lookup.csv
 TOP_ZONES = 20
 TOP_PAIRS = 20
 DEFAULT_BATCH_SIZE = 50_000
+# Per-batch count frames are folded into one after this many parts.
+COMPACT_PARTS = 200
 
 DISTANCE_BINS = [0, 1, 2, 5, 10, 20, 10_000]
 DISTANCE_LABELS = ["0-1", "1-2", "2-5", "5-10", "10-20", "20+"]
@@ -47,6 +52,10 @@ TIP_LABELS = ["0-5%", "5-10%", "10-15%", "15-20%", "20-25%", "25%+"]
 
 DOW_LABELS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
+DOW_HOUR_COLUMNS = ["service", "dow", "hour", "count"]
+PICKUP_COLUMNS = ["service", "year", "PULocationID", "trips"]
+OD_COLUMNS = ["service", "year", "PULocationID", "DOLocationID", "trips"]
+
 FIELD_ALIASES = {
     "pickup_datetime": [
         "tpep_pickup_datetime",
@@ -232,6 +241,32 @@ def resolve_columns(schema_names: set[str], fields: Iterable[str]) -> dict[str,
     return mapping
 
 
+@dataclass(frozen=True)
+class ColumnPlan:
+    mapping: dict[str, str]
+    reverse_map: dict[str, str]
+    columns: list[str]
+    present: frozenset[str]
+    fare_columns: dict[str, list[str]]
+
+
+@lru_cache(maxsize=None)
+def column_plan(schema_names: frozenset[str], fields: tuple[str, ...]) -> ColumnPlan:
+    """Per-schema column resolution; monthly files sharing a schema reuse it."""
+    mapping = resolve_columns(schema_names, fields)
+    present = frozenset(mapping)
+    return ColumnPlan(
+        mapping=mapping,
+        reverse_map={value: key for key, value in mapping.items()},
+        columns=list(mapping.values()),
+        present=present,
+        fare_columns={
+            component: [column for column in group if column in present]
+            for component, group in COMPONENT_GROUPS.items()
+        },
+    )
+
+
 def parse_datetime(series: pd.Series | None) -> pd.Series | None:
     if series is None:
         return None
@@ -270,6 +305,25 @@ def parse_datetime(series: pd.Series | None) -> pd.Series | None:
     return parsed
 
 
+def year_month_arrays(pickup: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """Year (int64) and datetime64[M] month straight from the datetime64 buffer."""
+    if getattr(pickup.dt, "tz", None) is not None:
+        pickup = pickup.dt.tz_localize(None)
+    months = pickup.to_numpy().astype("datetime64[M]")
+    years = months.astype("datetime64[Y]").astype("int64") + 1970
+    return years, months
+
+
+def duration_minutes(pickup: pd.Series, dropoff: pd.Series) -> pd.Series:
+    """Trip minutes from int64 ns arithmetic on the datetime buffers (NaN where NaT)."""
+    start = pickup.to_numpy(dtype="datetime64[ns]")
+    end = dropoff.to_numpy(dtype="datetime64[ns]")
+    valid = ~(np.isnat(start) | np.isnat(end))
+    minutes = np.full(len(start), np.nan)
+    minutes[valid] = (end.view("i8")[valid] - start.view("i8")[valid]) / 1_000_000_000 / 60.0
+    return pd.Series(minutes, index=pickup.index)
+
+
 def to_numeric(series: pd.Series | None) -> pd.Series:
     if series is None:
         return pd.Series([], dtype="float64")
@@ -277,10 +331,48 @@ def to_numeric(series: pd.Series | None) -> pd.Series:
 
 
 def add_group_counts(counter: dict[tuple, int], group: pd.Series, prefix: tuple) -> None:
-    for key, value in group.items():
+    # tolist() boxes the counts to Python ints in one C call, not one int() per key.
+    for key, value in zip(group.index, group.to_numpy().tolist()):
         if not isinstance(key, tuple):
             key = (key,)
-        counter[prefix + key] += int(value)
+        counter[prefix + key] += value
+
+
+def group_counts_part(group: pd.Series, service: str, columns: list[str]) -> pd.DataFrame:
+    """groupby().size() result -> frame with the service prepended as first key."""
+    part = group.reset_index()
+    part.columns = columns[1:]
+    part.insert(0, columns[0], service)
+    return part
+
+
+def sum_parts(parts: list[pd.DataFrame], columns: list[str]) -> pd.DataFrame:
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    *keys, value = columns
+    return (
+        pd.concat(parts, ignore_index=True)
+        .groupby(keys, sort=False, as_index=False)[value]
+        .sum()
+    )
+
+
+def append_part(parts: list[pd.DataFrame], part: pd.DataFrame, columns: list[str]) -> None:
+    parts.append(part)
+    if len(parts) >= COMPACT_PARTS:
+        parts[:] = [sum_parts(parts, columns)]
+
+
+def counts_frame(
+    counter: dict[tuple, float], columns: list[str], dtype: type = np.int64
+) -> pd.DataFrame:
+    """Counter {key tuple: value} -> DataFrame, built column-wise (no per-row dicts)."""
+    if not counter:
+        return pd.DataFrame(columns=columns)
+    *key_columns, value_column = columns
+    data = dict(zip(key_columns, zip(*counter.keys())))
+    data[value_column] = np.fromiter(counter.values(), dtype=dtype, count=len(counter))
+    return pd.DataFrame(data, columns=columns)
 
 
 def collect_parquet_files(
@@ -313,6 +405,26 @@ def split_outputs(root: Path, max_mb: int, remove_original: bool) -> None:
         args.append("--remove-original")
     subprocess.run(args, check=True)
 
+
+def row_groups_in_years(
+    pq_file: pq.ParquetFile, column: str, year_min: int, year_max: int
+) -> list[int]:
+    """Row groups whose pickup min/max statistics can hold rows in [year_min, year_max]."""
+    column_index = pq_file.schema.names.index(column)
+    keep = []
+    for index in range(pq_file.metadata.num_row_groups):
+        stats = pq_file.metadata.row_group(index).column(column_index).statistics
+        if (
+            stats is not None
+            and stats.has_min_max
+            and isinstance(stats.min, datetime)
+            and (stats.max.year < year_min or stats.min.year > year_max)
+        ):
+            continue
+        keep.append(index)
+    return keep
+
+
 def batch_to_pandas(batch) -> pd.DataFrame:
     try:
         return batch.to_pandas(self_destruct=True, use_threads=False)
@@ -338,16 +450,16 @@ def main() -> None:
     OUT_DIR.mkdir(parents=True, exist_ok=True)
     WEB_OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-    monthly_counts: dict[tuple, int] = defaultdict(int)
-    dow_hour_counts: dict[tuple, int] = defaultdict(int)
+    monthly_trips: dict[str, pd.Series] = {}
+    dow_hour_parts: list[pd.DataFrame] = []
     distance_counts: dict[tuple, int] = defaultdict(int)
     duration_counts: dict[tuple, int] = defaultdict(int)
     tip_counts: dict[tuple, int] = defaultdict(int)
     airport_counts: dict[tuple, int] = defaultdict(int)
     shared_counts: dict[tuple, int] = defaultdict(int)
     provider_counts: dict[tuple, int] = defaultdict(int)
-    pickup_counts: dict[tuple, int] = defaultdict(int)
-    od_counts: dict[tuple, int] = defaultdict(int)
+    pickup_parts: list[pd.DataFrame] = []
+    od_parts: list[pd.DataFrame] = []
     fare_sums: dict[tuple, float] = defaultdict(float)
     trip_totals: dict[str, int] = defaultdict(int)
     service_dates: dict[str, set] = defaultdict(set)
@@ -360,23 +472,33 @@ def main() -> None:
         file_bar = tqdm(files, desc=f"{spec.label} files")
         for file_path in file_bar:
             pq_file = pq.ParquetFile(file_path, memory_map=True)
-            schema_names = set(pq_file.schema.names)
-            mapping = resolve_columns(schema_names, spec.fields)
-            if "pickup_datetime" not in mapping:
+            plan = column_plan(frozenset(pq_file.schema.names), tuple(spec.fields))
+            if "pickup_datetime" not in plan.present:
                 continue
 
-            reverse_map = {value: key for key, value in mapping.items()}
-            columns = list(mapping.values())
+            # Column presence is fixed per file; resolve it once, not per batch.
+            reverse_map = plan.reverse_map
+            present = plan.present
+            fare_columns = plan.fare_columns
+
+            # Year filter pushed down to the parquet row-group statistics.
+            row_groups = row_groups_in_years(
+                pq_file, plan.mapping["pickup_datetime"], year_min, year_max
+            )
+            if not row_groups:
+                continue
 
             batch_bar = tqdm(
-                total=pq_file.metadata.num_rows,
+                total=sum(pq_file.metadata.row_group(index).num_rows for index in row_groups),
                 unit="rows",
                 desc=f"{file_path.name}",
                 leave=False,
             )
 
             batch_index = 0
-            for batch in pq_file.iter_batches(batch_size=args.batch_size, columns=columns):
+            for batch in pq_file.iter_batches(
+                batch_size=args.batch_size, row_groups=row_groups, columns=plan.columns
+            ):
                 batch_index += 1
                 df = batch_to_pandas(batch)
                 if df.empty:
@@ -396,34 +518,40 @@ def main() -> None:
                     continue
 
                 pickup = pickup[valid_pickup]
-                year = pickup.dt.year
-                valid_year = year.between(year_min, year_max)
+                pickup_years, pickup_months = year_month_arrays(pickup)
+                valid_year = (pickup_years >= year_min) & (pickup_years <= year_max)
                 if not valid_year.any():
                     batch_bar.update(batch.num_rows)
                     continue
-                valid_pickup = valid_pickup & valid_year.reindex(valid_pickup.index, fill_value=False)
+                valid_pickup = valid_pickup & pd.Series(valid_year, index=pickup.index).reindex(
+                    valid_pickup.index, fill_value=False
+                )
                 pickup = pickup[valid_year]
                 trip_totals[spec.key] += int(valid_pickup.sum())
 
-                year = pickup.dt.year
-                month = pickup.dt.month
+                year = pd.Series(pickup_years[valid_year], index=pickup.index)
                 hour = pickup.dt.hour
                 dow = pickup.dt.dayofweek
 
-                add_group_counts(
-                    monthly_counts,
-                    pd.DataFrame({"year": year, "month": month}).groupby(["year", "month"]).size(),
-                    (spec.key,),
+                month_values, month_sizes = np.unique(pickup_months[valid_year], return_counts=True)
+                month_counts = pd.Series(month_sizes, index=pd.PeriodIndex(month_values, freq="M"))
+                previous = monthly_trips.get(spec.key)
+                monthly_trips[spec.key] = (
+                    month_counts if previous is None else previous.add(month_counts, fill_value=0)
                 )
-                add_group_counts(
-                    dow_hour_counts,
-                    pd.DataFrame({"dow": dow, "hour": hour}).groupby(["dow", "hour"]).size(),
-                    (spec.key,),
+                append_part(
+                    dow_hour_parts,
+                    group_counts_part(
+                        pd.DataFrame({"dow": dow, "hour": hour}).groupby(["dow", "hour"]).size(),
+                        spec.key,
+                        DOW_HOUR_COLUMNS,
+                    ),
+                    DOW_HOUR_COLUMNS,
                 )
 
                 service_dates[spec.key].update(pickup.dt.date.unique().tolist())
 
-                if "trip_distance" in df.columns:
+                if "trip_distance" in present:
                     distance = to_numeric(df.get("trip_distance"))[valid_pickup]
                     distance = distance[(distance > 0) & (distance < 200)]
                     if not distance.empty:
@@ -440,13 +568,13 @@ def main() -> None:
                         )
 
                 duration = None
-                if "trip_time" in df.columns:
+                if "trip_time" in present:
                     duration = to_numeric(df.get("trip_time"))[valid_pickup] / 60.0
-                elif "dropoff_datetime" in df.columns:
+                elif "dropoff_datetime" in present:
                     dropoff = parse_datetime(df.get("dropoff_datetime"))
                     if dropoff is not None:
                         dropoff = dropoff[valid_pickup]
-                        duration = (dropoff - pickup).dt.total_seconds() / 60.0
+                        duration = duration_minutes(pickup, dropoff)
 
                 if duration is not None:
                     duration = duration[duration.notna()]
@@ -464,16 +592,15 @@ def main() -> None:
                             (spec.key,),
                         )
 
-                for component, columns_for_component in COMPONENT_GROUPS.items():
-                    values = []
-                    for column in columns_for_component:
-                        if column not in df.columns:
-                            continue
-                        values.append(to_numeric(df.get(column))[valid_pickup].fillna(0))
-                    if values:
+                for component, columns_for_component in fare_columns.items():
+                    if columns_for_component:
+                        values = [
+                            to_numeric(df[column])[valid_pickup].fillna(0)
+                            for column in columns_for_component
+                        ]
                         fare_sums[(spec.key, component)] += pd.concat(values, axis=1).sum().sum()
 
-                if "tip_amount" in df.columns and "base_fare" in df.columns:
+                if "tip_amount" in present and "base_fare" in present:
                     tip_amount = to_numeric(df.get("tip_amount"))[valid_pickup]
                     base_fare = to_numeric(df.get("base_fare"))[valid_pickup]
                     valid_tip = (base_fare > 0) & tip_amount.notna()
@@ -497,13 +624,13 @@ def main() -> None:
                                 (spec.key,),
                             )
 
-                if "airport_fee" in df.columns or "ratecode" in df.columns:
+                if "airport_fee" in present or "ratecode" in present:
                     airport_flag = pd.Series(False, index=pickup.index)
-                    if "airport_fee" in df.columns:
+                    if "airport_fee" in present:
                         airport_flag |= (
                             to_numeric(df.get("airport_fee"))[valid_pickup].fillna(0) > 0
                         )
-                    if "ratecode" in df.columns:
+                    if "ratecode" in present:
                         airport_flag |= to_numeric(df.get("ratecode"))[valid_pickup].isin([2, 3])
                     counts = airport_flag.value_counts()
                     airport_counts[(spec.key, True)] += int(counts.get(True, 0))
@@ -511,7 +638,7 @@ def main() -> None:
 
                 if spec.key in {"fhv", "hvfhs"}:
                     shared = None
-                    if "shared_match_flag" in df.columns:
+                    if "shared_match_flag" in present:
                         if spec.key == "fhv":
                             shared = to_numeric(df.get("shared_match_flag"))[valid_pickup].fillna(0) == 1
                         else:
@@ -522,7 +649,7 @@ def main() -> None:
                                 .str.strip()
                                 == "Y"
                             )
-                    if shared is None and "shared_request_flag" in df.columns:
+                    if shared is None and "shared_request_flag" in present:
                         shared = (
                             df.get("shared_request_flag")[valid_pickup]
                             .astype("string")
@@ -535,7 +662,7 @@ def main() -> None:
                         shared_counts[(spec.key, True)] += int(counts.get(True, 0))
                         shared_counts[(spec.key, False)] += int(counts.get(False, 0))
 
-                if spec.key == "hvfhs" and "provider" in df.columns:
+                if spec.key == "hvfhs" and "provider" in present:
                     provider = (
                         df.get("provider")[valid_pickup]
                         .astype("string")
@@ -544,30 +671,37 @@ def main() -> None:
                     )
                     provider = provider.map(HVFHS_PROVIDER_MAP).fillna(provider)
                     counts = provider.value_counts(dropna=True)
-                    for provider_name, count in counts.items():
-                        provider_counts[(provider_name,)] += int(count)
+                    add_group_counts(provider_counts, counts, ())
 
-                if "PULocationID" in df.columns:
+                if "PULocationID" in present:
                     pu = to_numeric(df.get("PULocationID"))[valid_pickup]
                     pickup_frame = pd.DataFrame({"year": year, "pu": pu}).dropna()
                     if not pickup_frame.empty:
                         pickup_frame["pu"] = pickup_frame["pu"].astype(int)
-                        add_group_counts(
-                            pickup_counts,
-                            pickup_frame.groupby(["year", "pu"]).size(),
-                            (spec.key,),
+                        append_part(
+                            pickup_parts,
+                            group_counts_part(
+                                pickup_frame.groupby(["year", "pu"]).size(),
+                                spec.key,
+                                PICKUP_COLUMNS,
+                            ),
+                            PICKUP_COLUMNS,
                         )
 
-                if "PULocationID" in df.columns and "DOLocationID" in df.columns:
+                if "PULocationID" in present and "DOLocationID" in present:
                     pu = to_numeric(df.get("PULocationID"))[valid_pickup]
                     do = to_numeric(df.get("DOLocationID"))[valid_pickup]
                     pairs = pd.DataFrame({"year": year, "pu": pu, "do": do}).dropna()
                     if not pairs.empty:
                         pairs[["pu", "do"]] = pairs[["pu", "do"]].astype(int)
-                        add_group_counts(
-                            od_counts,
-                            pairs.groupby(["year", "pu", "do"]).size(),
-                            (spec.key,),
+                        append_part(
+                            od_parts,
+                            group_counts_part(
+                                pairs.groupby(["year", "pu", "do"]).size(),
+                                spec.key,
+                                OD_COLUMNS,
+                            ),
+                            OD_COLUMNS,
                         )
 
                 batch_bar.update(batch.num_rows)
@@ -581,106 +715,92 @@ def main() -> None:
 
     output_files: list[Path] = []
 
-    monthly_rows = [
-        {"service": key, "year": year, "month": month, "trips": count}
-        for (key, year, month), count in monthly_counts.items()
-    ]
-    monthly_df = pd.DataFrame(
-        monthly_rows, columns=["service", "year", "month", "trips"]
-    )
-    if not monthly_df.empty:
-        monthly_df = monthly_df.sort_values(["service", "year", "month"])
+    monthly_df = pd.DataFrame(columns=["service", "year", "month", "trips"])
+    if monthly_trips:
+        periods = pd.concat(monthly_trips, names=["service", "period"]).rename("trips").reset_index()
+        monthly_df = pd.DataFrame(
+            {
+                "service": periods["service"],
+                "year": periods["period"].dt.year,
+                "month": periods["period"].dt.month,
+                "trips": periods["trips"].astype("int64"),
+            }
+        ).sort_values(["service", "year", "month"])
     monthly_path = OUT_DIR / "taxi_trip_volume_monthly.csv"
     monthly_df.to_csv(monthly_path, index=False)
     output_files.append(monthly_path)
 
-    dow_records = []
-    day_counts = []
+    day_frames = []
     for service, dates in service_dates.items():
         if not dates:
             continue
-        date_df = pd.DataFrame({"date": list(dates)})
-        date_df["dow"] = pd.to_datetime(date_df["date"]).dt.dayofweek
-        counts = date_df.groupby("dow").size()
-        for dow, value in counts.items():
-            day_counts.append({"service": service, "dow": dow, "days": int(value)})
-
-    days_df = pd.DataFrame(day_counts, columns=["service", "dow", "days"])
-    for (service, dow, hour), count in dow_hour_counts.items():
-        days = days_df.loc[
-            (days_df["service"] == service) & (days_df["dow"] == dow), "days"
-        ].sum()
-        avg = count / days if days else 0
-        dow_records.append(
-            {
-                "service": service,
-                "dow": dow,
-                "dow_label": DOW_LABELS[dow],
-                "hour": hour,
-                "avg_trips": round(avg, 2),
-            }
+        counts = pd.to_datetime(pd.Series(list(dates))).dt.dayofweek.value_counts()
+        day_frames.append(
+            pd.DataFrame({"service": service, "dow": counts.index, "days": counts.to_numpy()})
         )
-
-    dow_df = pd.DataFrame(
-        dow_records, columns=["service", "dow", "dow_label", "hour", "avg_trips"]
+    days_df = (
+        pd.concat(day_frames, ignore_index=True)
+        if day_frames
+        else pd.DataFrame(columns=["service", "dow", "days"])
     )
-    if not dow_df.empty:
-        dow_df = dow_df.sort_values(["service", "dow", "hour"])
+
+    dow_df = pd.DataFrame(columns=["service", "dow", "dow_label", "hour", "avg_trips"])
+    if dow_hour_parts:
+        dow_counts = sum_parts(dow_hour_parts, DOW_HOUR_COLUMNS)
+        dow_hour_parts.clear()
+        dow_counts = dow_counts.merge(days_df, on=["service", "dow"], how="left")
+        days = dow_counts["days"].fillna(0).to_numpy()
+        avg = np.divide(
+            dow_counts["count"].to_numpy(), days, out=np.zeros(len(days)), where=days > 0
+        )
+        dow_df = pd.DataFrame(
+            {
+                "service": dow_counts["service"],
+                "dow": dow_counts["dow"],
+                "dow_label": np.asarray(DOW_LABELS)[dow_counts["dow"].to_numpy()],
+                "hour": dow_counts["hour"],
+                "avg_trips": np.round(avg, 2),
+            }
+        ).sort_values(["service", "dow", "hour"])
     dow_path = OUT_DIR / "taxi_pickups_by_dow_hour.csv"
     dow_df.to_csv(dow_path, index=False)
     output_files.append(dow_path)
 
-    distance_rows = [
-        {"service": key, "distance_bin": bin_label, "trips": count}
-        for (key, bin_label), count in distance_counts.items()
-    ]
-    distance_df = pd.DataFrame(distance_rows, columns=["service", "distance_bin", "trips"])
+    distance_df = counts_frame(distance_counts, ["service", "distance_bin", "trips"])
     distance_path = OUT_DIR / "taxi_distance_bins.csv"
     distance_df.to_csv(distance_path, index=False)
     output_files.append(distance_path)
 
-    duration_rows = [
-        {"service": key, "duration_bin": bin_label, "trips": count}
-        for (key, bin_label), count in duration_counts.items()
-    ]
-    duration_df = pd.DataFrame(duration_rows, columns=["service", "duration_bin", "trips"])
+    duration_df = counts_frame(duration_counts, ["service", "duration_bin", "trips"])
     duration_path = OUT_DIR / "taxi_duration_bins.csv"
     duration_df.to_csv(duration_path, index=False)
     output_files.append(duration_path)
 
-    fare_rows = []
-    for (service, component), total in fare_sums.items():
-        trips = trip_totals.get(service, 0)
-        if trips == 0:
-            continue
-        fare_rows.append(
+    fare_df = pd.DataFrame(columns=["service", "component", "avg_amount"])
+    if fare_sums:
+        fare_totals = counts_frame(
+            fare_sums, ["service", "component", "total"], dtype=np.float64
+        )
+        fare_trips = fare_totals["service"].map(trip_totals).fillna(0)
+        fare_totals = fare_totals[fare_trips > 0]
+        fare_df = pd.DataFrame(
             {
-                "service": service,
-                "component": component,
-                "avg_amount": round(total / trips, 4),
-            }
+                "service": fare_totals["service"],
+                "component": fare_totals["component"],
+                "avg_amount": (fare_totals["total"] / fare_trips[fare_trips > 0]).round(4),
+            },
+            columns=["service", "component", "avg_amount"],
         )
-    fare_df = pd.DataFrame(fare_rows, columns=["service", "component", "avg_amount"])
     fare_path = OUT_DIR / "taxi_avg_fare_components.csv"
     fare_df.to_csv(fare_path, index=False)
     output_files.append(fare_path)
 
-    tip_rows = [
-        {"service": key, "tip_bin": bin_label, "trips": count}
-        for (key, bin_label), count in tip_counts.items()
-    ]
-    tip_df = pd.DataFrame(tip_rows, columns=["service", "tip_bin", "trips"])
+    tip_df = counts_frame(tip_counts, ["service", "tip_bin", "trips"])
     tip_path = OUT_DIR / "taxi_tip_rate_bins.csv"
     tip_df.to_csv(tip_path, index=False)
     output_files.append(tip_path)
 
-    airport_rows = [
-        {"service": key, "airport_trip": flag, "trips": count}
-        for (key, flag), count in airport_counts.items()
-    ]
-    airport_df = pd.DataFrame(
-        airport_rows, columns=["service", "airport_trip", "trips"]
-    )
+    airport_df = counts_frame(airport_counts, ["service", "airport_trip", "trips"])
     if not airport_df.empty:
         airport_df["share"] = airport_df.groupby("service")["trips"].transform(
             lambda x: (x / x.sum()).round(4)
@@ -689,11 +809,7 @@ def main() -> None:
     airport_df.to_csv(airport_path, index=False)
     output_files.append(airport_path)
 
-    shared_rows = [
-        {"service": key, "shared_trip": flag, "trips": count}
-        for (key, flag), count in shared_counts.items()
-    ]
-    shared_df = pd.DataFrame(shared_rows, columns=["service", "shared_trip", "trips"])
+    shared_df = counts_frame(shared_counts, ["service", "shared_trip", "trips"])
     if not shared_df.empty:
         shared_df["share"] = shared_df.groupby("service")["trips"].transform(
             lambda x: (x / x.sum()).round(4)
@@ -702,22 +818,15 @@ def main() -> None:
     shared_df.to_csv(shared_path, index=False)
     output_files.append(shared_path)
 
-    provider_rows = [
-        {"provider": provider, "trips": count}
-        for (provider,), count in provider_counts.items()
-    ]
-    provider_df = pd.DataFrame(provider_rows, columns=["provider", "trips"])
+    provider_df = counts_frame(provider_counts, ["provider", "trips"])
     if not provider_df.empty:
         provider_df["share"] = (provider_df["trips"] / provider_df["trips"].sum()).round(4)
     provider_path = OUT_DIR / "taxi_provider_share.csv"
     provider_df.to_csv(provider_path, index=False)
     output_files.append(provider_path)
 
-    pickup_rows = [
-        {"service": key, "year": year, "PULocationID": pu_id, "trips": count}
-        for (key, year, pu_id), count in pickup_counts.items()
-    ]
-    pickup_df = pd.DataFrame(pickup_rows, columns=["service", "year", "PULocationID", "trips"])
+    pickup_df = sum_parts(pickup_parts, PICKUP_COLUMNS)
+    pickup_parts.clear()
     zone_lookup = pd.read_csv(ZONE_LOOKUP)
     zone_lookup = zone_lookup.rename(columns={"LocationID": "PULocationID"})
     pickup_df = pickup_df.merge(zone_lookup, on="PULocationID", how="left")
@@ -737,7 +846,7 @@ def main() -> None:
     borough_df.to_csv(borough_path, index=False)
     output_files.append(borough_path)
 
-    pickup_latest = pickup_df.copy()
+    pickup_latest = pickup_df
     if not pickup_latest.empty:
         latest_years = pickup_latest.groupby("service")["year"].transform("max")
         pickup_latest = pickup_latest[pickup_latest["year"] == latest_years]
@@ -749,20 +858,11 @@ def main() -> None:
     pickup_top_path = OUT_DIR / "taxi_top_pickup_zones.csv"
     pickup_top_df.to_csv(pickup_top_path, index=False)
     output_files.append(pickup_top_path)
+    # Free the pickup frames before the (much larger) OD table is built.
+    del pickup_df, pickup_latest, pickup_top_df
 
-    od_rows = [
-        {
-            "service": key,
-            "year": year,
-            "PULocationID": pu_id,
-            "DOLocationID": do_id,
-            "trips": count,
-        }
-        for (key, year, pu_id, do_id), count in od_counts.items()
-    ]
-    od_df = pd.DataFrame(
-        od_rows, columns=["service", "year", "PULocationID", "DOLocationID", "trips"]
-    )
+    od_df = sum_parts(od_parts, OD_COLUMNS)
+    od_parts.clear()
     od_df = od_df.merge(
         zone_lookup.rename(
             columns={
@@ -790,10 +890,11 @@ def main() -> None:
     od_df["OriginZone"] = od_df["OriginZone"].fillna("Unknown")
     od_df["DestBorough"] = od_df["DestBorough"].fillna("Unknown")
     od_df["DestZone"] = od_df["DestZone"].fillna("Unknown")
-    od_latest = od_df.copy()
+    od_latest = od_df
     if not od_latest.empty:
         latest_years = od_latest.groupby("service")["year"].transform("max")
         od_latest = od_latest[od_latest["year"] == latest_years]
+    del od_df
     od_top_df = (
         od_latest.sort_values(["service", "trips"], ascending=[True, False])
         .groupby("service")
@@ -7,18 +7,32 @@ Author: Aron Maggisano
 
 from __future__ import annotations
 
+import hashlib
+import json
+import os
+import queue
 import re
 import shutil
+import threading
 import time
 import zipfile
-import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from pathlib import Path
 
 import requests
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
+from urllib3.util.retry import Retry
+
+try:
+    from lxml.etree import iterparse
+except ImportError:  # pragma: no cover - fallback when lxml is unavailable
+    from xml.etree.ElementTree import iterparse
 
 BASE_URL = "https://s3.amazonaws.com/tripdata/"
 DOWNLOAD_DIR = Path("data/tripdata")
+USER_AGENT = "NYC_mobility/1.0 (+requests)"
 
 # Typical monthly archives:
 # 202406-citibike-tripdata.zip or 202406-citibike-tripdata.csv.zip
@@ -26,6 +40,9 @@ MONTHLY_ZIP_RE = re.compile(r"^(?P<ym>\d{6})-citibike-tripdata(?:\.csv)?\.zip$")
 
 # S3 XML namespace for ListObjectsV2
 S3_NS = {"s3": "http://s3.amazonaws.com/doc/2006-03-01/"}
+S3_CONTENTS_TAG = f"{{{S3_NS['s3']}}}Contents"
+S3_IS_TRUNCATED_TAG = f"{{{S3_NS['s3']}}}IsTruncated"
+S3_NEXT_TOKEN_TAG = f"{{{S3_NS['s3']}}}NextContinuationToken"
 
 # ==========================
 # CONFIG
@@ -36,17 +53,93 @@ REMOVE_ZIP_AFTER_EXTRACT = True
 # Limit how many months to process at once (helps avoid disk saturation)
 MAX_ARCHIVES: int | None = None
 
+# Concurrent archive downloads (S3 caps throughput per connection, not per client)
+DOWNLOAD_WORKERS = int(os.environ.get("DL_CONCURRENCY", "8"))
+
+# Streaming chunk size for archive downloads
+DOWNLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Transient S3 errors (5xx, dropped connections) are retried with backoff
+HTTP_RETRIES = 5
+HTTP_POOL_SIZE = 32
+
+# Downloaded archives waiting for extraction (bounds disk used by pending zips)
+EXTRACT_QUEUE_SIZE = 32
+
+# Archives extracted in parallel (zlib releases the GIL while inflating)
+EXTRACT_WORKERS = min(8, os.cpu_count() or 1)
+
+# Copy buffer for extracted members (ZipFile.extract uses 64 KiB)
+EXTRACT_BUFFER_BYTES = 1024 * 1024
+
 # Minimum free space (GiB) required before extracting
 MIN_FREE_GIB_TO_EXTRACT = 10
 
 # Extract only CSV files (recommended)
-EXTRACT_ONLY_REGEX = re.compile(r".*\.csv$", re.IGNORECASE)
+EXTRACT_ONLY_REGEX = re.compile(r".*\.[Cc][Ss][Vv]")
+
+# Full CRC pass over every downloaded archive (extraction checks CRCs anyway)
+VERIFY_ZIPS = bool(os.environ.get("VERIFY_ZIPS"))
+
+# Read size used when hashing archives against their S3 ETag
+HASH_BLOCK_BYTES = 8 * 1024 * 1024
+
+# Reuse the bucket listing on re-runs (S3 listings carry no ETag to revalidate)
+LISTING_CACHE = DOWNLOAD_DIR / ".listing.json"
+LISTING_CACHE_TTL_SECONDS = 3600
+
+# Per-archive checkpoints (key -> ETag) so re-runs skip verified work;
+# delete the file to force a full re-download/re-extract
+PIPELINE_STATE = DOWNLOAD_DIR / ".pipeline_state.json"
 # ==========================
 
+_thread_local = threading.local()
+_print_lock = threading.Lock()
+
 
-def iter_s3_keys(session: requests.Session, prefix: str = "") -> list[str]:
-    """List all object keys from the S3 bucket using ListObjectsV2 (paginated)."""
-    keys: list[str] = []
+def log(message: str) -> None:
+    """Print a status line without garbling concurrent progress bars."""
+    with _print_lock:
+        tqdm.write(message)
+
+
+def make_session() -> requests.Session:
+    session = requests.Session()
+    session.headers.update({"User-Agent": USER_AGENT})
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+    )
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_SIZE,
+        pool_maxsize=HTTP_POOL_SIZE,
+        max_retries=retry,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def thread_session() -> requests.Session:
+    """One session per worker thread so TLS connections are reused across files."""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = make_session()
+        _thread_local.session = session
+    return session
+
+
+@dataclass(frozen=True)
+class S3Object:
+    key: str
+    size: int
+    etag: str
+
+
+def iter_s3_objects(session: requests.Session, prefix: str = "") -> list[S3Object]:
+    """List all objects (key, size, ETag) from the S3 bucket using ListObjectsV2 (paginated)."""
+    objects: list[S3Object] = []
     token: str | None = None
 
     while True:
@@ -56,26 +149,76 @@ def iter_s3_keys(session: requests.Session, prefix: str = "") -> list[str]:
         if token:
             params["continuation-token"] = token
 
-        response = session.get(BASE_URL, params=params, timeout=30)
-        response.raise_for_status()
+        # Parse while the body streams in, dropping each <Contents> once read.
+        with session.get(BASE_URL, params=params, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+
+            is_truncated = False
+            token = None
+            for _, element in iterparse(response.raw, events=("end",)):
+                if element.tag == S3_CONTENTS_TAG:
+                    key = element.findtext("s3:Key", default="", namespaces=S3_NS)
+                    if key:
+                        size = element.findtext("s3:Size", default="0", namespaces=S3_NS)
+                        etag = element.findtext("s3:ETag", default="", namespaces=S3_NS)
+                        objects.append(S3Object(key=key, size=int(size or 0), etag=etag))
+                    element.clear()
+                elif element.tag == S3_IS_TRUNCATED_TAG:
+                    is_truncated = (element.text or "").strip() == "true"
+                elif element.tag == S3_NEXT_TOKEN_TAG:
+                    token = (element.text or "").strip() or None
+
+        if not is_truncated or not token:
+            break
 
-        root = ET.fromstring(response.text)
-        for element in root.findall("s3:Contents", S3_NS):
-            key = element.findtext("s3:Key", default="", namespaces=S3_NS)
-            if key:
-                keys.append(key)
+    return objects
 
-        is_truncated = root.findtext(
-            "s3:IsTruncated", default="false", namespaces=S3_NS
-        ) == "true"
-        if not is_truncated:
-            break
 
-        token = root.findtext("s3:NextContinuationToken", default="", namespaces=S3_NS) or None
-        if not token:
-            break
+def load_cached_listing() -> list[S3Object] | None:
+    try:
+        payload = json.loads(LISTING_CACHE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if time.time() - payload.get("fetched_at", 0) > LISTING_CACHE_TTL_SECONDS:
+        return None
+    try:
+        return [S3Object(**item) for item in payload["objects"]]
+    except (KeyError, TypeError):
+        return None
+
+
+def write_json_atomic(path: Path, payload: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(path.name + ".tmp")
+    temp.write_text(json.dumps(payload), encoding="utf-8")
+    temp.replace(path)
+
 
-    return keys
+def save_listing(objects: list[S3Object]) -> None:
+    payload = {"fetched_at": time.time(), "objects": [asdict(obj) for obj in objects]}
+    write_json_atomic(LISTING_CACHE, payload)
+
+
+def load_pipeline_state() -> dict[str, dict[str, str]]:
+    try:
+        state = json.loads(PIPELINE_STATE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        state = {}
+    return {
+        "downloaded": dict(state.get("downloaded", {})),
+        "extracted": dict(state.get("extracted", {})),
+    }
+
+
+def list_s3_objects_cached(session: requests.Session) -> list[S3Object]:
+    objects = load_cached_listing()
+    if objects is not None:
+        log(f"[CACHE] Using S3 listing from {LISTING_CACHE} ({len(objects)} objects)")
+        return objects
+    objects = iter_s3_objects(session)
+    save_listing(objects)
+    return objects
 
 
 def fetch_zip_list(
@@ -84,18 +227,17 @@ def fetch_zip_list(
     year_from: int | None = None,
     year_to: int | None = None,
     months: set[str] | None = None,
-) -> list[str]:
+) -> list[S3Object]:
     """
-    Return the list of archive keys to download.
+    Return the list of archives to download, sorted by key.
 
     - If months is provided, download only those YYYYMM.
     - Otherwise, filter by year range (inclusive).
     """
-    all_keys = iter_s3_keys(session)
-    selected: list[str] = []
+    selected: dict[str, S3Object] = {}
 
-    for key in all_keys:
-        match = MONTHLY_ZIP_RE.match(key)
+    for obj in list_s3_objects_cached(session):
+        match = MONTHLY_ZIP_RE.match(obj.key)
         if not match:
             continue
 
@@ -109,89 +251,149 @@ def fetch_zip_list(
         if year_to is not None and year > year_to:
             continue
 
-        selected.append(key)
+        selected[obj.key] = obj
 
-    return sorted(set(selected))
+    return [selected[key] for key in sorted(selected)]
 
 
 def is_valid_zip(path: Path) -> bool:
-    """Fast+safe zip validation: file exists, is a zip, and passes testzip."""
+    """Fast zip validation: file exists and has a readable central directory.
+
+    The full testzip() decompression pass only runs with VERIFY_ZIPS set.
+    """
     if not path.exists() or path.stat().st_size == 0:
         return False
-    if not zipfile.is_zipfile(path):
-        return False
     try:
         with zipfile.ZipFile(path) as archive:
-            return archive.testzip() is None
+            return not VERIFY_ZIPS or archive.testzip() is None
     except zipfile.BadZipFile:
         return False
 
 
+def etag_md5(etag: str) -> str | None:
+    """Return the MD5 digest held by a single-part S3 ETag (multipart ETags contain '-')."""
+    value = etag.strip('"').lower()
+    if "-" in value or len(value) != 32:
+        return None
+    return value
+
+
+def hash_file(path: Path, digest=None):
+    """Feed the file into digest (a new MD5 by default) and return it."""
+    digest = digest or hashlib.md5()
+    with open(path, "rb") as handle:
+        while block := handle.read(HASH_BLOCK_BYTES):
+            digest.update(block)
+    return digest
+
+
+def matches_listing(path: Path, obj: S3Object) -> bool:
+    """Check a local archive against the listed size and, when available, the ETag MD5."""
+    if not path.exists() or path.stat().st_size != obj.size:
+        return False
+    expected = etag_md5(obj.etag)
+    return expected is None or hash_file(path).hexdigest() == expected
+
+
 def month_has_extracted_csvs(ym: str) -> bool:
     """Treat the month as extracted if at least one *_YYYYMM CSV exists."""
     pattern = f"{ym}-citibike-tripdata_*.csv"
     return any(DOWNLOAD_DIR.glob(pattern))
 
 
-def download_file(session: requests.Session, key: str) -> Path:
+def download_file(session: requests.Session, obj: S3Object) -> Path:
     DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
-    target = DOWNLOAD_DIR / key
+    target = DOWNLOAD_DIR / obj.key
     temp = target.with_name(target.name + ".part")
 
-    if temp.exists():
-        print(f"[CLEAN] Removing partial download: {temp.name}")
-        temp.unlink(missing_ok=True)
-
     if target.exists():
-        if is_valid_zip(target):
-            print(f"[SKIP] Valid archive already present: {target.name}")
+        if matches_listing(target, obj):
+            log(f"[SKIP] Archive already present and matches listing: {target.name}")
             return target
-        print(f"[REDL] Invalid archive found, re-downloading: {target.name}")
+        log(f"[REDL] Archive does not match listing, re-downloading: {target.name}")
         target.unlink(missing_ok=True)
 
-    url = f"{BASE_URL}{key}"
-    print(f"[DL]   {key}")
-
-    with session.get(url, stream=True, timeout=120) as response:
+    # Resume a partial download with a Range request instead of starting over.
+    digest = hashlib.md5()
+    resume_from = 0
+    if temp.exists():
+        partial = temp.stat().st_size
+        if 0 < partial < obj.size:
+            resume_from = partial
+            hash_file(temp, digest)
+        elif partial and matches_listing(temp, obj) and is_valid_zip(temp):
+            # Fully downloaded but interrupted before the rename: no request needed.
+            temp.replace(target)
+            log(f"[OK]   Recovered completed partial download: {target.name}")
+            return target
+        else:
+            log(f"[CLEAN] Removing partial download: {temp.name}")
+            temp.unlink(missing_ok=True)
+
+    url = f"{BASE_URL}{obj.key}"
+    headers = {"Range": f"bytes={resume_from}-"} if resume_from else {}
+    if resume_from:
+        log(f"[DL]   {obj.key} (resuming at {resume_from/1024/1024:.1f} MiB)")
+    else:
+        log(f"[DL]   {obj.key}")
+
+    with session.get(url, stream=True, timeout=120, headers=headers) as response:
         response.raise_for_status()
 
-        total = int(response.headers.get("Content-Length", "0") or 0)
-        chunk_size = 1024 * 1024
+        if resume_from and response.status_code != 206:
+            # The server ignored the range: the body is the whole object.
+            resume_from = 0
+            digest = hashlib.md5()
+
+        total = obj.size or resume_from + int(response.headers.get("Content-Length", "0") or 0)
 
         bar = tqdm(
             total=total if total > 0 else None,
+            initial=resume_from,
             unit="B",
             unit_scale=True,
             unit_divisor=1024,
             desc=target.name,
-            leave=True,
+            leave=False,
+            mininterval=1.0,
         )
 
-        start = time.time()
+        start = time.monotonic()
         downloaded = 0
 
         try:
-            with open(temp, "wb") as handle:
-                for chunk in response.iter_content(chunk_size=chunk_size):
-                    if not chunk:
-                        continue
+            with open(temp, "ab" if resume_from else "wb") as handle:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
                     handle.write(chunk)
+                    digest.update(chunk)
                     downloaded += len(chunk)
                     bar.update(len(chunk))
-                    elapsed = time.time() - start
-                    if elapsed > 0:
-                        speed = downloaded / elapsed
-                        bar.set_postfix_str(f"{speed/1024/1024:.1f} MB/s")
         finally:
             bar.close()
+        elapsed = time.monotonic() - start
+
+    size = temp.stat().st_size
+    if obj.size and size != obj.size:
+        # Keep the partial file so the next run can resume it.
+        raise RuntimeError(
+            f"Incomplete download for {target.name}: {size} of {obj.size} bytes."
+        )
+
+    expected = etag_md5(obj.etag)
+    if expected is not None and digest.hexdigest() != expected:
+        temp.unlink(missing_ok=True)
+        raise RuntimeError(f"Checksum mismatch for {target.name} (ETag {obj.etag}).")
 
+    # temp lives next to target, so this is a same-filesystem atomic rename
+    # (no EXDEV); keep it that way rather than staging under /tmp.
     temp.replace(target)
 
     if not is_valid_zip(target):
         target.unlink(missing_ok=True)
         raise RuntimeError(f"Download completed but archive is invalid: {target.name}")
 
-    print(f"[OK]   Saved: {target} ({downloaded/1024/1024:.1f} MiB)")
+    speed = downloaded / elapsed if elapsed > 0 else 0.0
+    log(f"[OK]   Saved: {target} ({size/1024/1024:.1f} MiB, {speed/1024/1024:.1f} MB/s)")
     return target
 
 
@@ -201,7 +403,12 @@ def free_gib(path: Path) -> float:
 
 
 def safe_extract_all_csvs(zip_path: Path, dest: Path) -> None:
-    """Extract all CSVs safely (file-by-file, no extractall)."""
+    """Extract all CSVs flat into dest (file-by-file, no extractall).
+
+    Members are written under their basename, since downstream scripts only glob
+    the top level of dest. Basenames that occur more than once in the archive are
+    renamed to <archive-stem>__<member path with "/" as "__"> so none is lost.
+    """
     available = free_gib(dest)
     if available < MIN_FREE_GIB_TO_EXTRACT:
         raise RuntimeError(
@@ -210,22 +417,60 @@ def safe_extract_all_csvs(zip_path: Path, dest: Path) -> None:
         )
 
     with zipfile.ZipFile(zip_path) as archive:
-        infos = archive.infolist()
+        infos = [
+            info
+            for info in archive.infolist()
+            if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+        ]
         if EXTRACT_ONLY_REGEX is not None:
-            infos = [info for info in infos if EXTRACT_ONLY_REGEX.match(info.filename)]
+            infos = [info for info in infos if EXTRACT_ONLY_REGEX.fullmatch(info.filename)]
 
         if not infos:
-            print(f"[UNZIP] No CSV files in {zip_path.name}, skipping.")
+            log(f"[UNZIP] No CSV files in {zip_path.name}, skipping.")
             return
 
-        print(f"[UNZIP] {zip_path.name} -> extracting {len(infos)} files")
-        dest_resolved = dest.resolve()
+        log(f"[UNZIP] {zip_path.name} -> extracting {len(infos)} files")
+        dest.mkdir(parents=True, exist_ok=True)
+
+        member_paths = [info.filename.replace("\\", "/") for info in infos]
+        basename_counts: dict[str, int] = {}
+        for member_path in member_paths:
+            name = os.path.basename(member_path)
+            basename_counts[name] = basename_counts.get(name, 0) + 1
 
-        for info in infos:
-            out_path = (dest / info.filename).resolve()
-            if not str(out_path).startswith(str(dest_resolved)):
+        skipped = 0
+        for info, member_path in zip(infos, member_paths):
+            name = os.path.basename(member_path)
+            if name in ("", ".", ".."):
                 raise ValueError(f"Suspicious path inside zip: {info.filename}")
-            archive.extract(info, path=dest)
+            if basename_counts[name] > 1:
+                # A bare name (no separators left) still cannot escape dest.
+                name = f"{zip_path.stem}__{member_path.replace('/', '__')}"
+                log(f"[WARN] {zip_path.name}: {info.filename} shares its name, saved as {name}")
+            target_path = dest / name
+            # Already extracted by an earlier run: same size and the member's own
+            # timestamp (set only once a file is fully written).
+            modified = time.mktime(info.date_time + (0, 0, -1))
+            try:
+                stat = target_path.stat()
+                if stat.st_size == info.file_size and int(stat.st_mtime) == int(modified):
+                    skipped += 1
+                    continue
+            except FileNotFoundError:
+                pass
+            with archive.open(info) as source, open(target_path, "wb") as target:
+                shutil.copyfileobj(source, target, length=EXTRACT_BUFFER_BYTES)
+            os.utime(target_path, (modified, modified))
+        if skipped:
+            log(f"[SKIP] {zip_path.name}: {skipped} CSV already extracted")
+
+
+def extract_archive(key: str, zip_path: Path) -> None:
+    safe_extract_all_csvs(zip_path, DOWNLOAD_DIR)
+    if REMOVE_ZIP_AFTER_EXTRACT:
+        zip_path.unlink(missing_ok=True)
+        log(f"[RM]   Removed zip: {zip_path.name}")
+    log(f"[DONE] {key}")
 
 
 def cleanup_extracted_zips() -> None:
@@ -236,17 +481,23 @@ def cleanup_extracted_zips() -> None:
             continue
         ym = match.group("ym")
         if month_has_extracted_csvs(ym):
-            print(f"[CLEANZIP] Removing extracted archive: {zip_path.name}")
+            log(f"[CLEANZIP] Removing extracted archive: {zip_path.name}")
             zip_path.unlink(missing_ok=True)
 
 
-def clean_empty_dirs(root: Path) -> None:
-    for path in sorted(root.rglob("*"), reverse=True):
-        if path.is_dir():
-            try:
-                next(path.iterdir())
-            except StopIteration:
-                shutil.rmtree(path, ignore_errors=True)
+def clean_empty_dirs(root: Path) -> bool:
+    """Remove empty subdirectories bottom-up; return True if root ended up empty."""
+    empty = True
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False) and clean_empty_dirs(Path(entry.path)):
+                try:
+                    os.rmdir(entry.path)
+                    continue
+                except OSError:
+                    pass
+            empty = False
+    return empty
 
 
 def main() -> None:
@@ -258,8 +509,7 @@ def main() -> None:
     # months = {"202401", "202402"}  # example
     # ==========================
 
-    session = requests.Session()
-    session.headers.update({"User-Agent": "NYC_mobility/1.0 (+requests)"})
+    session = make_session()
 
     files = fetch_zip_list(session, year_from=year_from, year_to=year_to, months=months)
     if not files:
@@ -268,29 +518,90 @@ def main() -> None:
     if MAX_ARCHIVES is not None:
         files = files[:MAX_ARCHIVES]
 
-    print(f"[LIST] {len(files)} archives found. EXTRACT={EXTRACT}")
+    log(f"[LIST] {len(files)} archives found. EXTRACT={EXTRACT}")
+
+    state = load_pipeline_state()
+    state_lock = threading.Lock()
 
-    for key in files:
-        match = MONTHLY_ZIP_RE.match(key)
+    def checkpoint(stage: str, obj: S3Object) -> None:
+        with state_lock:
+            state[stage][obj.key] = obj.etag
+            write_json_atomic(PIPELINE_STATE, state)
+
+    pending: list[S3Object] = []
+    for obj in files:
+        match = MONTHLY_ZIP_RE.match(obj.key)
         ym = match.group("ym") if match else None
 
+        if EXTRACT and state["extracted"].get(obj.key) == obj.etag:
+            log(f"[SKIP] {obj.key} already extracted (checkpoint).")
+            continue
         if ym and month_has_extracted_csvs(ym):
-            print(f"[SKIP] Month {ym} already extracted (CSV found).")
+            log(f"[SKIP] Month {ym} already extracted (CSV found).")
             continue
-
-        zip_path = download_file(session, key)
-
+        pending.append(obj)
+
+    # Downloads feed a queue that the extractors drain while later archives
+    # are still in flight, so unzip time hides behind network time.
+    extract_queue: queue.Queue[tuple[S3Object, Path] | None] = queue.Queue(maxsize=EXTRACT_QUEUE_SIZE)
+    extract_errors: list[Exception] = []
+
+    def extract_worker() -> None:
+        while True:
+            item = extract_queue.get()
+            if item is None:
+                break
+            if extract_errors:
+                continue
+            obj, zip_path = item
+            try:
+                extract_archive(obj.key, zip_path)
+                checkpoint("extracted", obj)
+            except Exception as exc:  # re-raised once the queue is drained
+                extract_errors.append(exc)
+
+    completed = 0
+    completed_lock = threading.Lock()
+
+    def download_worker(obj: S3Object) -> None:
+        nonlocal completed
+        zip_path = DOWNLOAD_DIR / obj.key
+        if state["downloaded"].get(obj.key) == obj.etag and (
+            zip_path.exists() and zip_path.stat().st_size == obj.size
+        ):
+            log(f"[SKIP] {obj.key} already verified (checkpoint).")
+        else:
+            zip_path = download_file(thread_session(), obj)
+            checkpoint("downloaded", obj)
+        with completed_lock:
+            completed += 1
+            log(f"[{completed}/{len(pending)}] Downloaded {obj.key}")
         if EXTRACT:
-            safe_extract_all_csvs(zip_path, DOWNLOAD_DIR)
-            if REMOVE_ZIP_AFTER_EXTRACT:
-                zip_path.unlink(missing_ok=True)
-                print(f"[RM]   Removed zip: {zip_path.name}")
+            extract_queue.put((obj, zip_path))
+        else:
+            log(f"[DONE] {obj.key}")
+
+    extractors = [
+        threading.Thread(target=extract_worker, name=f"extract-{index}", daemon=True)
+        for index in range(EXTRACT_WORKERS)
+    ]
+    for extractor in extractors:
+        extractor.start()
+    try:
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            list(executor.map(download_worker, pending))
+    finally:
+        for _ in extractors:
+            extract_queue.put(None)
+        for extractor in extractors:
+            extractor.join()
 
-        print(f"[DONE] {key}")
+    if extract_errors:
+        raise extract_errors[0]
 
     cleanup_extracted_zips()
     clean_empty_dirs(DOWNLOAD_DIR)
-    print(f"[ALL DONE] Output in {DOWNLOAD_DIR}")
+    log(f"[ALL DONE] Output in {DOWNLOAD_DIR}")
 
 
 if __name__ == "__main__":
@@ -7,6 +7,8 @@ from shapely.geometry import Point, shape
 from shapely.ops import unary_union
 from shapely.prepared import prep
 
+from geojson_io import write_geojson
+
 
 BOROUGHS_FILE = Path("web/data/geo/nyc_boroughs.geojson")
 OUT_DIR = Path("web/data/processed/geo")
@@ -49,7 +51,7 @@ def main() -> None:
                 filtered.append(feature)
 
         out_file = OUT_DIR / f"{name}_filtered.geojson"
-        out_file.write_text(json.dumps({"type": "FeatureCollection", "features": filtered}))
+        write_geojson(out_file, {"type": "FeatureCollection", "features": filtered})
         print(f"Wrote {out_file} with {len(filtered)} features")
 
 
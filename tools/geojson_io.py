@@ -0,0 +1,24 @@
+"""GeoJSON writer shared by the scripts that emit FeatureCollections.
+
+Imported as a sibling module by the isochrone, FHV and tripdata-route scripts
+(``uv run tools/<script>.py`` puts tools/ on sys.path).
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional, falls back to json
+    orjson = None
+
+
+def write_geojson(path: Path, payload: dict) -> None:
+    """orjson when available (bytes, NumPy-aware), stdlib json otherwise."""
+    if orjson is not None:
+        path.write_bytes(orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        # NumPy arrays (e.g. coordinate arrays) serialize as lists, as orjson writes them.
+        path.write_text(json.dumps(payload, default=lambda value: value.tolist()))
@@ -0,0 +1,130 @@
+"""Graph helpers shared by the street-network isochrone scripts.
+
+Imported as a sibling module by build_isochrones_full.py,
+build_isochrones_transit.py and build_tripdata_routes.py
+(``uv run tools/<script>.py`` puts tools/ on sys.path).
+"""
+
+from __future__ import annotations
+
+import pickle
+import time
+from pathlib import Path
+from typing import Callable
+
+import networkx as nx
+import numpy as np
+import osmnx as ox
+import shapely
+from pyproj import Transformer
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+
+# Built graphs are pickled here (osmnx only caches the raw Overpass responses)
+GRAPH_CACHE_DIR = Path("cache/graphs")
+GRAPH_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+
+def add_edge_lengths_safe(graph: nx.MultiDiGraph) -> nx.MultiDiGraph:
+    if hasattr(ox, "add_edge_lengths"):
+        return ox.add_edge_lengths(graph)
+    return ox.distance.add_edge_lengths(graph)
+
+
+def cached_graph(name: str, build: Callable[[], nx.MultiDiGraph]) -> nx.MultiDiGraph:
+    """Pickled graph under GRAPH_CACHE_DIR; rebuilt when missing or older than the TTL."""
+    path = GRAPH_CACHE_DIR / f"{name}.pickle"
+    try:
+        if time.time() - path.stat().st_mtime < GRAPH_CACHE_TTL_SECONDS:
+            with open(path, "rb") as handle:
+                graph = pickle.load(handle)
+            print(f"[CACHE] Loaded graph from {path}")
+            return graph
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+
+    graph = build()
+    GRAPH_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(path.name + ".tmp")
+    with open(temp, "wb") as handle:
+        pickle.dump(graph, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    temp.replace(path)
+    return graph
+
+
+def nearest_node(graph: nx.MultiDiGraph, lat: float, lng: float):
+    """Node closest to (lat, lng) by haversine distance over an unprojected graph."""
+    nodes = list(graph.nodes)
+    lng_lat = np.radians(
+        np.array(
+            [(graph.nodes[node]["x"], graph.nodes[node]["y"]) for node in nodes], dtype=np.float64
+        )
+    )
+    lat0, lng0 = np.radians(lat), np.radians(lng)
+    # Haversine term is monotonic in distance, so its argmin is the nearest node.
+    hav = (
+        np.sin((lng_lat[:, 1] - lat0) / 2) ** 2
+        + np.cos(lat0) * np.cos(lng_lat[:, 1]) * np.sin((lng_lat[:, 0] - lng0) / 2) ** 2
+    )
+    return nodes[int(np.argmin(hav))]
+
+
+def length_csr(graph: nx.MultiDiGraph) -> tuple[np.ndarray, csr_matrix]:
+    """Node ids + CSR matrix of edge lengths, keeping the shortest of parallel edges."""
+    nodes = np.asarray(list(graph.nodes))
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array(
+        [(index[u], index[v], w) for u, v, w in graph.edges(data="length", default=0.0)],
+        dtype=np.float64,
+    ).reshape(-1, 3)
+    rows = edges[:, 0].astype(np.int64)
+    cols = edges[:, 1].astype(np.int64)
+    weights = edges[:, 2]
+
+    # csr_matrix would sum duplicate (u, v) entries; Dijkstra needs the minimum.
+    order = np.lexsort((weights, cols, rows))
+    rows, cols, weights = rows[order], cols[order], weights[order]
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+
+    matrix = csr_matrix(
+        (weights[first], (rows[first], cols[first])), shape=(len(nodes), len(nodes))
+    )
+    return nodes, matrix
+
+
+def travel_time_csr(
+    lengths: tuple[np.ndarray, csr_matrix], speed_kmh: float
+) -> tuple[np.ndarray, csr_matrix]:
+    """Per-mode travel times: one divide over the shared length matrix, no graph copy."""
+    nodes, matrix = lengths
+    speed_m_s = speed_kmh * 1000 / 3600
+    return nodes, matrix / speed_m_s if speed_m_s > 0 else matrix * 0.0
+
+
+def reachable_times(
+    csr: tuple[np.ndarray, csr_matrix], source, cutoff: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """Positions (in graph.nodes order) reachable within cutoff seconds, sorted by time.
+
+    One Dijkstra run serves every smaller cutoff: the nodes within c seconds
+    are the prefix ``positions[: np.searchsorted(seconds, c, side="right")]``.
+    """
+    nodes, matrix = csr
+    source_index = int(np.flatnonzero(nodes == source)[0])
+    dist = dijkstra(matrix, directed=True, indices=source_index, limit=cutoff)
+    reached = np.flatnonzero(dist <= cutoff)
+    reached = reached[np.argsort(dist[reached], kind="stable")]
+    return reached, dist[reached]
+
+
+def nodes_within(positions: np.ndarray, seconds: np.ndarray, cutoff: float) -> np.ndarray:
+    return positions[: np.searchsorted(seconds, cutoff, side="right")]
+
+
+def transform_geometry(geometry, transformer: Transformer):
+    """Reproject every vertex in one pyproj array call (no per-point Python callback)."""
+    return shapely.transform(
+        geometry, lambda xy: np.column_stack(transformer.transform(xy[:, 0], xy[:, 1]))
+    )
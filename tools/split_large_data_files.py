@@ -2,7 +2,9 @@ from __future__ import annotations
 
 import argparse
 import json
+import os
 import re
+import shutil
 from pathlib import Path
 
 try:
@@ -15,11 +17,15 @@ except ImportError:  # pragma: no cover - fallback when tqdm is unavailable
 DEFAULT_ROOT = Path("data")
 DEFAULT_MAX_MB = 100
 TARGET_EXTENSIONS = {".csv"}
+# Copy buffer used when stitching nested parts back together
+MERGE_BUFFER_BYTES = 4 * 1024 * 1024
+# Largest single os.sendfile call (Linux caps a call at ~2 GiB anyway)
+SENDFILE_MAX_BYTES = 1 << 30
 
-PART_RE = re.compile(r"^(?P<stem>.+)_part(?P<index>\d+)(?P<suffix>\.[^.]+)$", re.IGNORECASE)
+# Part names are generated by split_csv itself, so "_part" is always lowercase.
+PART_RE = re.compile(r"(?P<stem>.+)_part(?P<index>\d+)(?P<suffix>\.[^.]+)")
 NESTED_PART_RE = re.compile(
-    r"^(?P<base>.+)_part(?P<outer>\d+)_part(?P<inner>\d+)(?P<suffix>\.[^.]+)$",
-    re.IGNORECASE,
+    r"(?P<base>.+)_part(?P<outer>\d+)_part(?P<inner>\d+)(?P<suffix>\.[^.]+)"
 )
 
 
@@ -47,6 +53,20 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
+def list_files(root: Path) -> list[Path]:
+    """Recursively list regular files using the type info returned by scandir."""
+    files: list[Path] = []
+    pending = [root]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(Path(entry.path))
+                elif entry.is_file():
+                    files.append(Path(entry.path))
+    return files
+
+
 def bytes_limit(max_mb: int) -> int:
     return max_mb * 1024 * 1024
 
@@ -54,12 +74,12 @@ def bytes_limit(max_mb: int) -> int:
 def discover_existing_parts(file_list: list[Path]) -> dict[Path, list[Path]]:
     parts: dict[Path, list[Path]] = {}
     for path in file_list:
-        match = PART_RE.match(path.name)
+        match = PART_RE.fullmatch(path.name)
         if not match:
             continue
         base_name = f"{match.group('stem')}{match.group('suffix')}"
         base_path = path.with_name(base_name)
-        if PART_RE.match(base_path.name):
+        if PART_RE.fullmatch(base_path.name):
             continue
         parts.setdefault(base_path, []).append(path)
     return parts
@@ -67,14 +87,14 @@ def discover_existing_parts(file_list: list[Path]) -> dict[Path, list[Path]]:
 
 def sort_parts(paths: list[Path]) -> list[Path]:
     def part_index(path: Path) -> int:
-        match = PART_RE.match(path.name)
+        match = PART_RE.fullmatch(path.name)
         return int(match.group("index")) if match else 0
 
     return sorted(paths, key=part_index)
 
 def sort_nested_parts(paths: list[Path]) -> list[Path]:
     def inner_index(path: Path) -> int:
-        match = NESTED_PART_RE.match(path.name)
+        match = NESTED_PART_RE.fullmatch(path.name)
         return int(match.group("inner")) if match else 0
 
     return sorted(paths, key=inner_index)
@@ -203,14 +223,43 @@ def should_split(path: Path, max_bytes: int) -> bool:
         return False
     if path.suffix.lower() not in TARGET_EXTENSIONS:
         return False
-    if PART_RE.match(path.name):
+    if PART_RE.fullmatch(path.name):
         return False
     return path.stat().st_size > max_bytes
 
+def read_header(path: Path) -> bytes:
+    with path.open("rb") as handle:
+        return handle.readline().rstrip(b"\r\n")
+
+
+def copy_file_tail(in_handle, out_handle, offset: int, size: int) -> None:
+    """Append in_handle[offset:size] to out_handle, kernel-side when possible."""
+    out_handle.flush()
+    remaining = size - offset
+    try:
+        while remaining > 0:
+            sent = os.sendfile(
+                out_handle.fileno(),
+                in_handle.fileno(),
+                offset,
+                min(remaining, SENDFILE_MAX_BYTES),
+            )
+            if sent == 0:
+                break
+            offset += sent
+            remaining -= sent
+    except (AttributeError, OSError):
+        # No sendfile on this platform/filesystem: finish in user space.
+        pass
+    if remaining > 0:
+        in_handle.seek(offset)
+        shutil.copyfileobj(in_handle, out_handle, length=MERGE_BUFFER_BYTES)
+
+
 def normalize_nested_parts(file_list: list[Path]) -> None:
     nested_groups: dict[Path, list[Path]] = {}
     for path in file_list:
-        match = NESTED_PART_RE.match(path.name)
+        match = NESTED_PART_RE.fullmatch(path.name)
         if not match:
             continue
         base_part_name = f"{match.group('base')}_part{match.group('outer')}{match.group('suffix')}"
@@ -229,14 +278,33 @@ def normalize_nested_parts(file_list: list[Path]) -> None:
             continue
 
         base_part_path.parent.mkdir(parents=True, exist_ok=True)
-        with base_part_path.open("w", encoding="utf-8", newline="") as out_handle:
+        # Refuse to stitch parts whose columns diverge, before touching anything.
+        reference_header = read_header(nested_paths[0])
+        for nested_path in nested_paths[1:]:
+            if read_header(nested_path) != reference_header:
+                raise SystemExit(
+                    f"Header mismatch between {nested_paths[0].name} and {nested_path.name}; "
+                    f"not merging into {base_part_path.name}."
+                )
+
+        ends_with_newline = True
+        with base_part_path.open("wb") as out_handle:
             for index, nested_path in enumerate(nested_paths):
-                with nested_path.open("r", encoding="utf-8", newline="") as in_handle:
+                with nested_path.open("rb") as in_handle:
                     header = in_handle.readline()
                     if index == 0:
                         out_handle.write(header)
-                    for line in in_handle:
-                        out_handle.write(line)
+                        ends_with_newline = header.endswith(b"\n")
+                    body_start = in_handle.tell()
+                    size = in_handle.seek(0, 2)
+                    if size == body_start:
+                        continue
+                    in_handle.seek(-1, 2)
+                    last_byte = in_handle.read(1)
+                    if not ends_with_newline:
+                        out_handle.write(b"\n")
+                    copy_file_tail(in_handle, out_handle, body_start, size)
+                    ends_with_newline = last_byte == b"\n"
 
         for nested_path in nested_paths:
             nested_path.unlink(missing_ok=True)
@@ -250,7 +318,7 @@ def cleanup_part_manifests(file_list: list[Path]) -> None:
         if not path.name.endswith(".parts.json"):
             continue
         base_name = path.name.replace(".parts.json", ".csv")
-        if PART_RE.match(base_name):
+        if PART_RE.fullmatch(base_name):
             path.unlink(missing_ok=True)
 
 
@@ -262,13 +330,11 @@ def main() -> None:
     if not root.exists():
         raise SystemExit(f"Missing directory: {root}")
 
-    all_paths = list(root.rglob("*"))
-    file_list = [path for path in all_paths if path.is_file()]
+    file_list = list_files(root)
     normalize_nested_parts(file_list)
     cleanup_part_manifests(file_list)
 
-    all_paths = list(root.rglob("*"))
-    file_list = [path for path in all_paths if path.is_file()]
+    file_list = list_files(root)
 
     existing_parts = discover_existing_parts(file_list)
     processed_bases = set()
@@ -305,7 +371,7 @@ def main() -> None:
             continue
         if path in processed_bases:
             continue
-        if any(PART_RE.match(p.name) for p in existing_parts.get(path, [])):
+        if any(PART_RE.fullmatch(p.name) for p in existing_parts.get(path, [])):
             continue
 
         part_paths = split_csv(path, max_bytes)